@@ -1,6 +1,7 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
 import time
+import os
 
 def __session_id():
     # use current time in seconds as id
@@ -24,7 +25,11 @@ session_key = __session_id()
 
 CACHE_DIR = '/cache'
 
+# upper bound of worker processes that solve a bandwidth sweep, whatever a
+# request asks for
+MAX_SWEEP_WORKERS = os.cpu_count() or 1
+
 DATA_TYPES = ("node", "link", "traffic", "multicast_group")
 
 from .data import StateManager
-from .data import sm, node, link, traffic, multicast_group
\ No newline at end of file
+from .data import sm, node, link, traffic, multicast_group, topology, aggregation
\ No newline at end of file
@@ -1,6 +1,8 @@
 # Author: yf-yang <directoryyf@gmail.com>
 from .state_manager import StateManager
 from .base import BaseDataManager
+from .topology import topology
+from .aggregation import aggregation
 
 # Initialize data
 sm = StateManager()
@@ -0,0 +1,381 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+# maximum number of entries of the journal, beyond that the version is bumped
+# instead, solving a scenario again is cheaper than replaying that many deltas
+# and the journal never grows without limit
+JOURNAL_LIMIT = 1024
+
+def _bandwidth(t):
+    """Bandwidth of a traffic, a cleared bandwidth counts as 0."""
+    return t.get('bandwidth') or 0
+
+# Clusters of a version of the aggregation, see TrafficAggregation.snapshot().
+# The journal is the one of that version, entries after position are not
+# included in the bandwidth of clusters yet.
+Clusters = namedtuple("Clusters", "version utraffic mtraffic "
+    "dst_src_combination groups journal position")
+
+def _copy_clusters(clusters):
+    return {
+        dst: {
+            src: {
+                'traffic': list(cluster['traffic']),
+                'bandwidth': cluster['bandwidth']
+            } for src, cluster in srcs.items()
+        } for dst, srcs in clusters.items()
+    }
+
+def _locked(f):
+    """Decorator to call a method of TrafficAggregation with its lock."""
+    @wraps(f)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return f(self, *args, **kwargs)
+    return locked
+
+class TrafficAggregation(object):
+    """Incremental aggregation of traffic for route simulations.
+
+    Traffic are clustered first by destination, then source, so the
+    simulations only need to compute one route for each destination-source
+    pair. The aggregation is kept up to date by WRITE operations of
+    TrafficManager and MulticastGroupManager.
+
+    Routes only depend on which clusters exist, so the version is bumped by
+    every change except an update that only changes the bandwidth of a
+    traffic. Such updates are appended to the journal instead, and derived
+    bandwidth overviews apply them as deltas. The journal is emptied whenever
+    the version is bumped, and the version is bumped once the journal reaches
+    JOURNAL_LIMIT entries.
+
+    The clusters are modified in place, so simulations work on snapshots of
+    them instead, see snapshot().
+
+    Bumps and journal entries could be held for a batch of changes, then the
+    version is bumped at most once when the batch ends, see hold().
+
+    Warning: All the attributes are shared with the simulations, they should
+    never be modified outside this class.
+    """
+
+    def __init__(self):
+        self.version = 0
+        # WRITE operations and snapshots may come from different threads
+        self._lock = threading.RLock()
+        # number of nested hold(), whether a bump is held and held entries of
+        # the journal
+        self._holds = 0
+        self._pending = False
+        self._held = []
+        self._clear()
+
+    def _clear(self):
+        # traffic is grouped by address methods (UNICAST/MULTICAST)
+        # {
+        #     destination: {
+        #         source: {
+        #             {
+        #                 "traffic": [
+        #                     {
+        #                         "ID": trafficID,
+        #                         "bandwidth": bandwidth,
+        #                     }
+        #                 ],
+        #                 "bandwidth": total bandwidth,
+        #             }
+        #         }
+        #     }
+        # }
+        self.utraffic = {}
+        self.mtraffic = {}
+        # A mapping from destination to all possible sources
+        self.dst_src_combination = {}
+
+        # trafficID -> (address_method, destination, source)
+        self._flows = {}
+        # multicast group ID -> devices of the group
+        self._groups = {}
+        # destination -> source -> number of clusters that need the route
+        self._dst_src_count = defaultdict(lambda: defaultdict(int))
+
+        # bandwidth changes of clusters since the version is bumped
+        # [(address_method, destination, source, delta)]
+        self.journal = []
+
+    @_locked
+    def rebuild(self, traffic, multicast_group):
+        """Rebuild the whole aggregation.
+
+        Traffic are grouped by the columnar table of traffic instead of being
+        added one by one.
+
+        Parameters
+        ----------
+        traffic : TrafficManager
+            Manager of traffic.
+
+        multicast_group : dict
+            Mapping from multicast group ID to multicast group state.
+        """
+        self._clear()
+        for mgID, mg in multicast_group.items():
+            self._groups[mgID] = tuple(mg['devices'])
+        for key, (trafficIDs, bandwidths) in traffic.table.clusters().items():
+            address_method, dst, src = key
+            if address_method == 'UNICAST':
+                clusters = self.utraffic
+            elif address_method == 'MULTICAST':
+                clusters = self.mtraffic
+            else:
+                continue
+
+            if dst not in clusters:
+                clusters[dst] = {}
+            clusters[dst][src] = {
+                'traffic': [
+                    {
+                        'ID': trafficID,
+                        'bandwidth': bandwidth
+                    } for trafficID, bandwidth in zip(trafficIDs, bandwidths)
+                ],
+                'bandwidth': sum(bandwidths, 0.0)
+            }
+            self._flows.update(dict.fromkeys(trafficIDs, key))
+            self._link_cluster(address_method, dst, src)
+        self._bump()
+        logger.info("Rebuilt traffic aggregation of %d traffic"
+            % len(self._flows))
+
+    @_locked
+    def add_traffic(self, trafficID, t):
+        """Add a traffic to its cluster.
+
+        Parameters
+        ----------
+        trafficID : str
+            ID of the traffic.
+
+        t : dict
+            State of the traffic.
+        """
+        address_method = t['destination']['address_method']
+        src = t['source']['device']
+        if address_method == 'UNICAST':
+            dst = t['destination']['device']
+            clusters = self.utraffic
+        elif address_method == 'MULTICAST':
+            dst = t['destination']['multicast_group']
+            clusters = self.mtraffic
+        else:
+            return
+
+        if dst not in clusters:
+            clusters[dst] = {}
+        if src not in clusters[dst]:
+            clusters[dst][src] = {'traffic': [], 'bandwidth': 0.0}
+            self._link_cluster(address_method, dst, src)
+
+        cluster = clusters[dst][src]
+        cluster['traffic'].append(
+            {
+                'ID': trafficID,
+                'bandwidth': _bandwidth(t)
+            })
+        cluster['bandwidth'] += _bandwidth(t)
+        self._flows[trafficID] = (address_method, dst, src)
+        self._bump()
+
+    @_locked
+    def update_traffic(self, trafficID, t):
+        """Move a traffic to its new cluster or refresh its bandwidth.
+
+        Parameters
+        ----------
+        trafficID : str
+            ID of the traffic.
+
+        t : dict
+            New state of the traffic.
+        """
+        address_method = t['destination']['address_method']
+        dst = t['destination'][
+            'device' if address_method == 'UNICAST' else 'multicast_group']
+        src = t['source']['device']
+
+        if self._flows.get(trafficID) != (address_method, dst, src):
+            self.remove_traffic(trafficID)
+            self.add_traffic(trafficID, t)
+            return
+
+        # the traffic stays in the same cluster, keep its position
+        clusters = self.utraffic if address_method == 'UNICAST' \
+            else self.mtraffic
+        cluster = clusters[dst][src]
+        for flow in cluster['traffic']:
+            if flow['ID'] == trafficID:
+                flow['bandwidth'] = _bandwidth(t)
+        bandwidth = cluster['bandwidth']
+        cluster['bandwidth'] = sum(
+            (flow['bandwidth'] for flow in cluster['traffic']), 0.0)
+
+        # routes are unchanged, only the bandwidth along them
+        if cluster['bandwidth'] != bandwidth:
+            self._record(
+                (address_method, dst, src, cluster['bandwidth'] - bandwidth))
+
+    @_locked
+    def remove_traffic(self, trafficID):
+        """Remove a traffic from its cluster.
+
+        Parameters
+        ----------
+        trafficID : str
+            ID of the traffic.
+        """
+        if trafficID not in self._flows:
+            return
+        address_method, dst, src = self._flows.pop(trafficID)
+        clusters = self.utraffic if address_method == 'UNICAST' \
+            else self.mtraffic
+
+        cluster = clusters[dst][src]
+        cluster['traffic'] = [
+            flow for flow in cluster['traffic'] if flow['ID'] != trafficID
+        ]
+        cluster['bandwidth'] = sum(
+            (flow['bandwidth'] for flow in cluster['traffic']), 0.0)
+
+        if not cluster['traffic']:
+            clusters[dst].pop(src)
+            if not clusters[dst]:
+                clusters.pop(dst)
+            self._unlink_cluster(address_method, dst, src)
+        self._bump()
+
+    @_locked
+    def update_group(self, mgID, mg):
+        """Refresh devices of a multicast group.
+
+        Parameters
+        ----------
+        mgID : str
+            ID of the multicast group.
+
+        mg : dict or None
+            New state of the multicast group, None if it is deleted.
+        """
+        srcs = list(self.mtraffic.get(mgID, ()))
+        for src in srcs:
+            self._unlink_cluster('MULTICAST', mgID, src)
+
+        if mg is None:
+            self._groups.pop(mgID, None)
+        else:
+            self._groups[mgID] = tuple(mg['devices'])
+
+        for src in srcs:
+            self._link_cluster('MULTICAST', mgID, src)
+        self._bump()
+
+    @_locked
+    def snapshot(self):
+        """Copy the clusters for a simulation.
+
+        Dicts and lists of the clusters are copied, so a simulation could
+        iterate them while WRITE operations go on. Entries of traffic are
+        shared, and the bandwidth of clusters is the one when the snapshot is
+        taken, later changes are in the journal after position.
+
+        Returns
+        -------
+        clusters : Clusters
+            Clusters of the current version.
+        """
+        return Clusters(
+            version=self.version,
+            utraffic=_copy_clusters(self.utraffic),
+            mtraffic=_copy_clusters(self.mtraffic),
+            dst_src_combination={
+                dst: set(srcs)
+                    for dst, srcs in self.dst_src_combination.items()
+            },
+            groups={
+                mgID: self._groups.get(mgID, ()) for mgID in self.mtraffic
+            },
+            journal=self.journal,
+            position=len(self.journal)
+        )
+
+    @contextmanager
+    def hold(self):
+        """Context manager to hold bumps and journal entries.
+
+        The lock is held as well, so snapshots never see a part of the batch.
+        When the outermost one exits, the version is bumped once if any bump
+        is held, otherwise the held entries are appended to the journal.
+        """
+        with self._lock:
+            self._holds += 1
+            try:
+                yield
+            finally:
+                self._holds -= 1
+                if not self._holds:
+                    held, self._held = self._held, []
+                    if self._pending:
+                        self._pending = False
+                        self._bump()
+                    else:
+                        for entry in held:
+                            self._record(entry)
+
+    def _record(self, entry):
+        if self._holds:
+            self._held.append(entry)
+        elif len(self.journal) < JOURNAL_LIMIT:
+            self.journal.append(entry)
+        else:
+            logger.info("Journal is full, bumping the version")
+            self._bump()
+
+    def _bump(self):
+        if self._holds:
+            self._pending = True
+            return
+        self.version += 1
+        # a new list, readers may still hold the old one
+        self.journal = []
+
+    def _destinations(self, address_method, dst):
+        """Destination devices of a cluster."""
+        if address_method == 'UNICAST':
+            return (dst,)
+        return self._groups.get(dst, ())
+
+    def _link_cluster(self, address_method, dst, src):
+        for dst_device in self._destinations(address_method, dst):
+            self._dst_src_count[dst_device][src] += 1
+            self.dst_src_combination.setdefault(dst_device, set()).add(src)
+
+    def _unlink_cluster(self, address_method, dst, src):
+        for dst_device in self._destinations(address_method, dst):
+            count = self._dst_src_count[dst_device]
+            count[src] -= 1
+            if count[src] > 0:
+                continue
+            count.pop(src)
+            self.dst_src_combination[dst_device].discard(src)
+            if not count:
+                self._dst_src_count.pop(dst_device)
+                self.dst_src_combination.pop(dst_device)
+
+# traffic aggregation of the internal state, maintained by the data managers
+aggregation = TrafficAggregation()
@@ -1,6 +1,7 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
-from .utils import read_only, return_copy, ProhibitedAccessError
+from .utils import (
+    read_only, return_view, ReadOnlyDict, ProhibitedAccessError)
 import abc
 from collections.abc import MutableMapping
 from .singleton import Singleton
@@ -49,7 +50,7 @@ class BaseDataManager(MutableMapping, metaclass=abc.ABCMeta):
 
     def __len__(self): return len(self._data)
 
-    @return_copy
+    @return_view
     def __getitem__(self, key):
         if key in self._data:
             return self._data[key]
@@ -76,10 +77,39 @@ class BaseDataManager(MutableMapping, metaclass=abc.ABCMeta):
     def __repr__(self): 
         return repr(self._data)
 
-    @return_copy
+    @return_view
     def as_dict(self):
         return self._data
 
+    def snapshot(self):
+        """Take a snapshot of the data.
+
+        Records are never modified in place, a WRITE operation replaces a
+        record with a new one that shares its unchanged parts with the old
+        one. So only the mapping from IDs to records is copied, and the
+        snapshot is not affected by later WRITE operations.
+
+        Returns
+        -------
+        snapshot : ReadOnlyDict
+            Read-only view of the data at the moment.
+        """
+        return ReadOnlyDict(self._data.copy())
+
+    def restore(self, snapshot):
+        """Restore the data from a snapshot.
+
+        Derived indexes are not rebuilt, see StateManager.restore.
+
+        Parameters
+        ----------
+        snapshot : ReadOnlyDict
+            Snapshot taken by snapshot().
+        """
+        self._data = snapshot._data.copy()
+        logger.info("Restored %s from a snapshot of %d records"
+            % (type(self).__name__, len(self._data)))
+
     @abc.abstractmethod
     def create(self, *args, **kwargs):
         raise NotImplementedError
@@ -3,7 +3,10 @@
 from .base import SingletonDataManager
 from .exceptions import (NonStandardAccessError, WrongLinkError, 
     ProhibitedAccessError)
-from .utils import wrap_exception, dict_delete, empty_query
+from .utils import (
+    wrap_exception, dict_delete, empty_query, return_view,
+    Record)
+from .topology import topology
 from uuid import uuid4
 from collections import namedtuple
 import logging
@@ -12,6 +15,13 @@ logger = logging.getLogger(__name__)
 # Namedtuple to store a node ID - port ID pair
 EndPoint = namedtuple("EndPoint", "node port")
 
+class LinkRecord(Record):
+    """State of a link. See Record."""
+    __slots__ = ('endpoints', 'available_bandwidth')
+    _converters = {
+        'endpoints': lambda endpoints: tuple(EndPoint(*ep) for ep in endpoints)
+    }
+
 class LinkManager(SingletonDataManager):
     """Manager of link.
 
@@ -23,9 +33,18 @@ class LinkManager(SingletonDataManager):
     always allowed.
 
     Note that UPDATE operation for ETH link is prohibited.
+
+    Links are stored as LinkRecord instead of dicts.
     """
 
+    def __init__(self, data=None):
+        super().__init__(data=data)
+        self._data = {
+            ID: LinkRecord.from_dict(l) for ID, l in self._data.items()
+        }
+
     @wrap_exception
+    @return_view
     def create(self, query):
         """Create a link.
 
@@ -78,15 +97,17 @@ class LinkManager(SingletonDataManager):
             ID = uuid4().hex
 
         # establish link
-        self._data[ID] = {
-            "endpoints": list(endpoints),
-            "available_bandwidth": available_bandwidth
-        }
+        self._data[ID] = LinkRecord(
+            endpoints=endpoints,
+            available_bandwidth=available_bandwidth
+        )
+        topology.add_link(ID, self._data[ID])
         logger.info("Created link %.8s" % ID)
 
         return {ID: self._data[ID]}
 
     @wrap_exception
+    @return_view
     @empty_query
     def update(self, target, query):
         """ Prohibited interface.
@@ -99,6 +120,7 @@ class LinkManager(SingletonDataManager):
                 "create a new one to perform an update")
 
     @wrap_exception
+    @return_view
     @empty_query
     def delete(self, target, query):
         """Delete a link or all link.
@@ -122,9 +144,10 @@ class LinkManager(SingletonDataManager):
         
         if query == {}:
             self._data.pop(target)
+            topology.remove_link(target)
             logger.info("Deleted %s" % name)
             return target
         else: # useless now but may be useful later
-            self._data[target] = dict_delete(self._data, query, prefix=name)
+            self._data[target] = dict_delete(link, query, prefix=name)
             logger.info("Cleared parameters above of %s" % name)
             return {target: self._data[target]}
@@ -1,9 +1,13 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
 from .base import SingletonDataManager
-from .utils import wrap_exception, empty_query, dict_delete, dict_update
+from .utils import (
+    wrap_exception, empty_query, dict_delete, dict_update,
+    return_view)
 from .validator import MulticastGroupValidator, InitMulticastGroupValidator
+from .aggregation import aggregation
 from uuid import uuid4
+from copy import deepcopy
 import json
 import os.path as osp
 
@@ -22,6 +26,7 @@ class MulticastGroupManager(SingletonDataManager):
     """
 
     @wrap_exception
+    @return_view
     def create(self, query):
         """ Create a multicast group.
 
@@ -45,14 +50,16 @@ class MulticastGroupManager(SingletonDataManager):
         InitMulticastGroupValidator.validate(query)
 
         logger.info("Initialized multicast group %.8s from profile" % ID)
-        configuration = query
+        configuration = deepcopy(query)
 
         self._data[ID] = configuration
+        aggregation.update_group(ID, configuration)
         logger.info("Created multicast group %.8s" % ID)
 
         return {ID: self._data[ID]}
 
     @wrap_exception
+    @return_view
     def update(self, target, query):
         """ Update a multicast group.
 
@@ -79,11 +86,13 @@ class MulticastGroupManager(SingletonDataManager):
         MulticastGroupValidator.validate(query)
 
         self._data[target] = dict_update(group, query, name)
+        aggregation.update_group(target, self._data[target])
         logger.info("Updated parameters above of %s" % name)
 
         return {target: self._data[target]}
 
     @wrap_exception
+    @return_view
     def delete(self, target, query):
         """Delete a multicast group. or all multicast group.
         Parameters
@@ -110,9 +119,11 @@ class MulticastGroupManager(SingletonDataManager):
         
         if query == {}:
             self._data.pop(target)
+            aggregation.update_group(target, None)
             logger.info("Deleted %s" % name)
             return target
         else:
             self._data[target] = dict_delete(group, query, name)
+            aggregation.update_group(target, self._data[target])
             logger.info("Cleared parameters above of %s" % name)
             return {target: self._data[target]}
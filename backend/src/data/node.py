@@ -4,9 +4,12 @@ from .base import SingletonDataManager
 from .exceptions import (NonStandardAccessError, WrongNodeTypeError,
     WrongBusTypeError)
 from .utils import (
-    wrap_exception, empty_query, return_copy, dict_update, dict_delete)
+    wrap_exception, empty_query, return_view, dict_update,
+    dict_delete)
 from .validator import InitNodeValidator, NodeValidator
+from .topology import topology
 from uuid import uuid4
+from copy import deepcopy
 import json
 import os.path as osp
 
@@ -28,6 +31,7 @@ class NodeManager(SingletonDataManager):
     """
 
     @wrap_exception
+    @return_view
     def create(self, query,
             node_type=None, model=None):
         """ Create a node.
@@ -72,14 +76,16 @@ class NodeManager(SingletonDataManager):
         InitNodeValidator.validate(query)
 
         logger.info("Initialized node %.8s from schema" % ID)
-        configuration = query
+        configuration = deepcopy(query)
 
         self._data[ID] = configuration
+        topology.add_node(ID, configuration)
         logger.info("Created node %.8s" % ID)
 
         return {ID: self._data[ID]}
 
     @wrap_exception
+    @return_view
     def update(self, target, query):
         """ Update a node.
         Modify one node at a time, but multiple ports could be modified 
@@ -110,11 +116,13 @@ class NodeManager(SingletonDataManager):
         NodeValidator.validate(query)
 
         self._data[target] = dict_update(node, query, name)
+        topology.update_node(target, self._data[target])
         logger.info("Updated parameters above of %s" % name)
 
         return {target: self._data[target]}
 
     @wrap_exception
+    @return_view
     def delete(self, target, query):
         """Delete a node. or all node.
         Parameters
@@ -139,15 +147,17 @@ class NodeManager(SingletonDataManager):
         
         if query == {}:
             self._data.pop(target)
+            topology.remove_node(target)
             logger.info("Deleted %s" % name)
             return target
         else:
             self._data[target] = dict_delete(node, query, name)
+            topology.update_node(target, self._data[target])
             logger.info("Cleared parameters above of %s" % name)
             return {target: self._data[target]}
 
     @wrap_exception
-    @return_copy
+    @return_view
     def switches(self):
         """Acquire all switches.
 
@@ -160,7 +170,7 @@ class NodeManager(SingletonDataManager):
                     if v["type"] == "SWITCH"}
 
     @wrap_exception
-    @return_copy
+    @return_view
     def devices(self):
         """Acquire all devices.
 
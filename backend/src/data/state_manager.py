@@ -4,9 +4,12 @@ from .node import NodeManager
 from .link import LinkManager
 from .traffic import TrafficManager
 from .mcast import MulticastGroupManager
+from .topology import topology
+from .aggregation import aggregation
 from .singleton import Singleton
 from .utils import read_only
 from .exceptions import InvalidAccessError
+from contextlib import contextmanager
 
 import logging
 logger = logging.getLogger(__name__)
@@ -59,7 +62,10 @@ class StateManager(metaclass=Singleton):
                 data=state.get("traffic", None))
             self._multicast_group = MulticastGroupManager(
                 data=state.get("multicast_group", None))
-            
+
+        topology.rebuild(self._node, self._link)
+        aggregation.rebuild(self._traffic, self._multicast_group)
+
     def create(self, data_type, **kwargs):
         """Create new data instance according to the query.
 
@@ -137,6 +143,110 @@ class StateManager(metaclass=Singleton):
             raise InvalidAccessError("Unknown data type %s" % data_type)
         return getattr(self, data_type).delete(target=target, **kwargs)
 
+    @read_only
+    def generation(self):
+        """Generation of what derived data such as routes depend on.
+
+        It is a tuple of versions of the topology index and the traffic
+        aggregation, so it changes by every WRITE operation except an update
+        that only changes the bandwidth of a traffic.
+        """
+        return (topology.version, aggregation.version)
+
+    def snapshot(self):
+        """Take a snapshot of the internal state.
+
+        Records are shared with the internal state instead of being copied,
+        so it is cheap to take a snapshot before a series of WRITE operations
+        to undo them later.
+
+        Returns
+        -------
+        snapshot : dict
+            Mapping from data type to the snapshot of its data manager.
+        """
+        return {
+            dt: getattr(self, dt).snapshot() for dt in self.__DATA_TYPES__
+        }
+
+    def restore(self, snapshot):
+        """Restore the internal state from a snapshot.
+
+        Parameters
+        ----------
+        snapshot : dict
+            Snapshot taken by snapshot().
+        """
+        for dt in self.__DATA_TYPES__:
+            getattr(self, dt).restore(snapshot[dt])
+
+        topology.rebuild(self._node, self._link)
+        aggregation.rebuild(self._traffic, self._multicast_group)
+
+    @contextmanager
+    def transaction(self):
+        """Context manager to perform a batch of WRITE operations atomically.
+
+        If any operation of the batch fails, the internal state is restored
+        to the snapshot taken when the transaction begins and the exception
+        is re-raised. Versions of the topology index and the traffic
+        aggregation are bumped at most once when the outermost transaction
+        ends, so derived data such as routes are invalidated once per batch.
+
+        Yields
+        ------
+        state_manager : StateManager
+            The state manager itself.
+        """
+        snapshot = self.snapshot()
+        with topology.hold(), aggregation.hold():
+            try:
+                yield self
+            except BaseException:
+                logger.warning("Transaction failed, restoring the internal "
+                    "state")
+                self.restore(snapshot)
+                raise
+
+    def apply(self, ops):
+        """Perform a batch of WRITE operations atomically.
+
+        All the operations are checked before any of them is performed, then
+        they are performed in order in a transaction, see transaction().
+
+        Parameters
+        ----------
+        ops : list of dict
+            Each operation is a dict with key "method" (one of "create",
+            "update" and "delete") and "data_type". The other keys are
+            arguments of the method, e.g. "target" and "query".
+
+        Returns
+        -------
+        results : list
+            What each operation returns.
+        """
+        ops = list(ops)
+        for i, op in enumerate(ops):
+            if not isinstance(op, dict):
+                raise InvalidAccessError("Operation %d should be a dict, got "
+                    "%s" % (i, op.__class__.__name__))
+            if op.get("method") not in ("create", "update", "delete"):
+                raise InvalidAccessError("Unknown method %s of operation %d"
+                    % (op.get("method"), i))
+            if op.get("data_type") not in self.__DATA_TYPES__:
+                raise InvalidAccessError("Unknown data type %s of operation "
+                    "%d" % (op.get("data_type"), i))
+
+        results = []
+        with self.transaction():
+            for op in ops:
+                kwargs = dict(op)
+                method = getattr(self, kwargs.pop("method"))
+                results.append(method(**kwargs))
+        logger.info("Applied %d operations" % len(ops))
+        return results
+
     def as_dict(self):
         return {
             dt: getattr(self, dt).as_dict() for dt in self.__DATA_TYPES__
@@ -0,0 +1,168 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from array import array
+
+import logging
+logger = logging.getLogger(__name__)
+
+class TrafficTable(object):
+    """Columnar table of the keys of traffic.
+
+    Each traffic takes a row, and each of its keys is stored in a column of
+    its own: address method, source, destination and bandwidth. Strings are
+    interned to integers, so the columns are compact arrays, and grouping
+    traffic by their keys only compares integers. Bandwidth is kept as is in
+    a list, it may be fractional, and a cleared bandwidth counts as 0.
+
+    Rows are appended in the order of creation and an updated traffic keeps
+    its row. Rows of deleted traffic are left empty and dropped once they take
+    up half of the table.
+
+    Warning: All the columns are shared with the readers, they should never
+    be modified outside this class.
+    """
+
+    def __init__(self):
+        # code -> string, and string -> code
+        self._strings = []
+        self._codes = {}
+
+        # row -> trafficID, None if the traffic is deleted
+        self.ids = []
+        # row -> code of the key
+        self.methods = array('l')
+        self.sources = array('l')
+        self.destinations = array('l')
+        # row -> bandwidth
+        self.bandwidths = []
+
+        # trafficID -> row
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, trafficID):
+        return trafficID in self._rows
+
+    def _intern(self, string):
+        code = self._codes.get(string)
+        if code is None:
+            code = self._codes[string] = len(self._strings)
+            self._strings.append(string)
+        return code
+
+    def set(self, trafficID, address_method, src, dst, bandwidth):
+        """Add a traffic or overwrite its row.
+
+        Parameters
+        ----------
+        trafficID : str
+            ID of the traffic.
+
+        address_method : str
+            Address method of the traffic.
+
+        src : str
+            Source device ID.
+
+        dst : str
+            Destination device ID of UNICAST traffic or multicast group ID of
+            MULTICAST traffic.
+
+        bandwidth : int, float or None
+            Bandwidth of the traffic, None if it is cleared.
+        """
+        if bandwidth is None:
+            bandwidth = 0
+        method = self._intern(address_method)
+        src = self._intern(src)
+        dst = self._intern(dst)
+
+        row = self._rows.get(trafficID)
+        if row is None:
+            self._rows[trafficID] = len(self.ids)
+            self.ids.append(trafficID)
+            self.methods.append(method)
+            self.sources.append(src)
+            self.destinations.append(dst)
+            self.bandwidths.append(bandwidth)
+        else:
+            self.methods[row] = method
+            self.sources[row] = src
+            self.destinations[row] = dst
+            self.bandwidths[row] = bandwidth
+
+    def remove(self, trafficID):
+        """Remove a traffic.
+
+        Parameters
+        ----------
+        trafficID : str
+            ID of the traffic.
+        """
+        row = self._rows.pop(trafficID)
+        self.ids[row] = None
+        if 2 * len(self._rows) < len(self.ids):
+            self._compact()
+
+    def _compact(self):
+        rows = [row for row, ID in enumerate(self.ids) if ID is not None]
+        self.ids = [self.ids[row] for row in rows]
+        for name in ('methods', 'sources', 'destinations'):
+            column = getattr(self, name)
+            setattr(self, name,
+                array(column.typecode, [column[row] for row in rows]))
+        self.bandwidths = [self.bandwidths[row] for row in rows]
+        self._rows = {ID: row for row, ID in enumerate(self.ids)}
+        logger.debug("Compacted traffic table to %d rows" % len(rows))
+
+    def row(self, trafficID):
+        """Row of a traffic, rows are in the order of creation."""
+        return self._rows[trafficID]
+
+    def keys(self, trafficID):
+        """Keys of a traffic.
+
+        Returns
+        -------
+        address_method, src, dst : tuple
+            Keys of the traffic.
+        """
+        row = self._rows[trafficID]
+        strings = self._strings
+        return (
+            strings[self.methods[row]],
+            strings[self.sources[row]],
+            strings[self.destinations[row]]
+        )
+
+    def clusters(self):
+        """Group traffic by address method, destination and source.
+
+        Returns
+        -------
+        clusters : dict
+            Mapping from (address_method, dst, src) to (trafficIDs,
+            bandwidths), the columns of the traffic of the cluster. Both
+            clusters and traffic of a cluster are in the order of creation.
+        """
+        groups = {}
+        for trafficID, method, src, dst, bandwidth in zip(self.ids,
+                self.methods, self.sources, self.destinations,
+                self.bandwidths):
+            if trafficID is None:
+                continue
+            key = (method, dst, src)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = ([trafficID], [bandwidth])
+            else:
+                group[0].append(trafficID)
+                group[1].append(bandwidth)
+
+        strings = self._strings
+        return {
+            (strings[method], strings[dst], strings[src]): group
+                for (method, dst, src), group in groups.items()
+        }
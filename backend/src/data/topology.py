@@ -0,0 +1,236 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
+
+import logging
+logger = logging.getLogger(__name__)
+
+class TopologyIndex(object):
+    """Incremental index of the network topology.
+
+    The index is owned by the state layer and kept up to date by WRITE
+    operations of NodeManager and LinkManager, so route simulations could read
+    the graph directly instead of rebuilding it from every node and link.
+
+    The version is bumped by every change of the graph. Bumps could be held
+    for a batch of changes, then the version is bumped once when the batch
+    ends, see hold().
+
+    Warning: All the attributes are shared with the simulations, they should
+    never be modified outside this class.
+    """
+
+    def __init__(self):
+        # bumped by every change of the graph, so derived data such as route
+        # simulations know whether they are still valid
+        self.version = 0
+        # number of nested hold(), and whether a bump is held
+        self._holds = 0
+        self._pending = False
+        self._clear()
+
+    def _clear(self):
+        # view the topology as a directed graph
+        # represented by adjacency matrix
+        # {
+        #     to: [
+        #         (
+        #             hop,
+        #             from, to,
+        #             speed,
+        #             from_port, from_port_bit, to_port, to_port_bit,
+        #             linkID
+        #         )
+        #     ]
+        # }
+        self.adjacency = defaultdict(list)
+        # ETH nodes in the order of creation, nodeID -> node type
+        self.eth_nodes = OrderedDict()
+        # IDs of all the switches
+        self.switches = set()
+
+        # nodeID -> {port: port_bit}
+        self._port_bits = {}
+        # linkID -> (x, x_port, y, y_port, speed)
+        self._links = {}
+        # nodeID -> IDs of links that connect to the node
+        self._node_links = defaultdict(set)
+
+    def rebuild(self, nodes, links):
+        """Rebuild the whole index.
+
+        Parameters
+        ----------
+        nodes : dict
+            Mapping from node ID to node state.
+
+        links : dict
+            Mapping from link ID to link state.
+        """
+        with self.hold():
+            self._clear()
+            for nodeID, n in nodes.items():
+                self.add_node(nodeID, n)
+            for linkID, l in links.items():
+                self.add_link(linkID, l)
+            self._bump()
+        logger.info("Rebuilt topology index of %d nodes and %d links"
+            % (len(self._port_bits), len(self._links)))
+
+    def add_node(self, nodeID, n):
+        """Register a node.
+
+        Parameters
+        ----------
+        nodeID : str
+            ID of the node.
+
+        n : dict
+            State of the node.
+        """
+        # device port bit is undefined, assume they are all -1 for now
+        self._port_bits[nodeID] = {
+            port: p.get('port_bit', -1) for port, p in n['ports'].items()
+        }
+        if n['protocol'] == 'ETH':
+            self.eth_nodes[nodeID] = n['type']
+        if n['type'] == 'SWITCH':
+            self.switches.add(nodeID)
+        self._bump()
+
+    def update_node(self, nodeID, n):
+        """Refresh a node and all the links connect to it.
+
+        Parameters
+        ----------
+        nodeID : str
+            ID of the node.
+
+        n : dict
+            New state of the node.
+        """
+        self.add_node(nodeID, n)
+        for linkID in self._node_links[nodeID]:
+            self._refresh_link(linkID)
+
+    def remove_node(self, nodeID):
+        """Unregister a node.
+
+        Links that connect to the node are no longer able to carry any traffic,
+        so they are removed from the graph as well.
+
+        Parameters
+        ----------
+        nodeID : str
+            ID of the node.
+        """
+        for linkID in list(self._node_links[nodeID]):
+            self.remove_link(linkID)
+        self._node_links.pop(nodeID, None)
+        self._port_bits.pop(nodeID, None)
+        self.eth_nodes.pop(nodeID, None)
+        self.switches.discard(nodeID)
+        self.adjacency.pop(nodeID, None)
+        self._bump()
+
+    def add_link(self, linkID, l):
+        """Register a link.
+
+        Parameters
+        ----------
+        linkID : str
+            ID of the link.
+
+        l : dict
+            State of the link.
+        """
+        (x, x_port), (y, y_port) = l['endpoints']
+        if x not in self._port_bits or y not in self._port_bits:
+            logger.warning("Link %.8s connects to unknown nodes, skipped"
+                % linkID)
+            return
+        self._links[linkID] = (x, x_port, y, y_port, l['available_bandwidth'])
+        self._node_links[x].add(linkID)
+        self._node_links[y].add(linkID)
+
+        to_y, to_x = self._link_tuples(linkID)
+        self.adjacency[y].append(to_y)
+        self.adjacency[x].append(to_x)
+        self._bump()
+
+    def remove_link(self, linkID):
+        """Unregister a link.
+
+        Parameters
+        ----------
+        linkID : str
+            ID of the link.
+        """
+        if linkID not in self._links:
+            return
+        x, _, y, _, _ = self._links.pop(linkID)
+        for nodeID in (x, y):
+            self._node_links[nodeID].discard(linkID)
+            self.adjacency[nodeID] = [
+                link_info for link_info in self.adjacency[nodeID]
+                    if link_info[-1] != linkID
+            ]
+        self._bump()
+
+    def _link_tuples(self, linkID):
+        """Adjacency entries of a link toward both of its endpoints."""
+        x, x_port, y, y_port, speed = self._links[linkID]
+        x_port_bit = self._port_bits[x][x_port]
+        y_port_bit = self._port_bits[y][y_port]
+        return (
+            (
+                1,
+                x, y,
+                speed,
+                x_port, x_port_bit, y_port, y_port_bit,
+                linkID
+            ),
+            (
+                1,
+                y, x,
+                speed,
+                y_port, y_port_bit, x_port, x_port_bit,
+                linkID
+            )
+        )
+
+    def _refresh_link(self, linkID):
+        """Replace adjacency entries of a link in place."""
+        x, _, y, _, _ = self._links[linkID]
+        for nodeID, link_info in zip((y, x), self._link_tuples(linkID)):
+            self.adjacency[nodeID] = [
+                link_info if l[-1] == linkID else l
+                    for l in self.adjacency[nodeID]
+            ]
+        self._bump()
+
+    @contextmanager
+    def hold(self):
+        """Context manager to hold version bumps.
+
+        The version is bumped once when the outermost one exits, if the graph
+        is changed in between.
+        """
+        self._holds += 1
+        try:
+            yield
+        finally:
+            self._holds -= 1
+            if not self._holds and self._pending:
+                self._pending = False
+                self._bump()
+
+    def _bump(self):
+        if self._holds:
+            self._pending = True
+        else:
+            self.version += 1
+
+# topology of the internal state, maintained by the data managers
+topology = TopologyIndex()
@@ -3,8 +3,12 @@
 from .base import SingletonDataManager
 from .exceptions import NonStandardAccessError, WrongTrafficTypeError
 from .validator import TrafficValidator, InitTrafficValidator
+from .aggregation import aggregation
+from .table import TrafficTable
 from .utils import (
-    wrap_exception, empty_query, return_copy, dict_delete, dict_update)
+    wrap_exception, empty_query, return_view, dict_delete,
+    dict_update, read_only, Record)
+from collections import defaultdict
 import json
 import os.path as osp
 from uuid import uuid4
@@ -14,6 +18,26 @@ logger = logging.getLogger(__name__)
 
 __TRAFFIC_TYPE__ = ("IP",)
 
+class TrafficSource(Record):
+    """Source of a traffic. See Record."""
+    __slots__ = ('device', 'port')
+
+class TrafficDestination(Record):
+    """Destination of a traffic. See Record.
+
+    Only one of device (UNICAST) and multicast_group (MULTICAST) is set.
+    """
+    __slots__ = ('address_method', 'device', 'multicast_group', 'port')
+
+class TrafficRecord(Record):
+    """State of a traffic. See Record."""
+    __slots__ = ('type', 'name', 'protocol', 'source', 'destination',
+        'max_latency', 'max_jitter', 'bandwidth', 'priority')
+    _converters = {
+        'source': TrafficSource.from_dict,
+        'destination': TrafficDestination.from_dict,
+    }
+
 class TrafficManager(SingletonDataManager):
     """Manager of traffic
 
@@ -23,9 +47,143 @@ class TrafficManager(SingletonDataManager):
     The class exposes methods of GET, CREATE, UPDATE and DELETE. All the WRITE 
     operations should be performed w.r.t. given methods, but READ operations are
     always allowed.
+
+    Traffic are also indexed by source device, unicast destination device,
+    multicast group and address method, so they could be looked up without
+    scanning the whole state. Their keys and bandwidth are also kept in a
+    columnar table, so they could be grouped without reading the records.
+
+    Traffic are stored as TrafficRecord instead of dicts.
     """
 
+    def __init__(self, data=None):
+        super().__init__(data=data)
+        self._data = {
+            ID: TrafficRecord.from_dict(t) for ID, t in self._data.items()
+        }
+        # source device -> IDs of traffic
+        self._by_source = defaultdict(set)
+        # destination device -> IDs of UNICAST traffic
+        self._by_device = defaultdict(set)
+        # multicast group ID -> IDs of MULTICAST traffic
+        self._by_group = defaultdict(set)
+        # address method -> IDs of traffic
+        self._by_method = defaultdict(set)
+        self._reindex()
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        self._reindex()
+
+    def _reindex(self):
+        for index in (self._by_source, self._by_device, self._by_group,
+                self._by_method):
+            index.clear()
+        # address method, source, destination and bandwidth of traffic
+        self._table = TrafficTable()
+        for ID, t in self._data.items():
+            self._index(ID, t)
+
+    @read_only
+    def table(self):
+        """Columnar table of the keys of traffic, see TrafficTable."""
+        return self._table
+
+    def lookup(self, src=None, dst=None, method=None, trafficID=None):
+        """Look up traffic that satisfy all the given conditions.
+
+        Parameters
+        ----------
+        src : str
+            Source device ID.
+
+        dst : str
+            Destination device ID of UNICAST traffic or multicast group ID of
+            MULTICAST traffic. Both are matched if method is not given.
+
+        method : str
+            Address method of the traffic.
+
+        trafficID : str
+            ID of the traffic.
+
+        Returns
+        -------
+        traffic : list
+            Tuples of (trafficID, address method, source, destination) in the
+            order of creation.
+        """
+        candidates = []
+        if trafficID is not None:
+            candidates.append(
+                {trafficID} if trafficID in self._table else set())
+        if src is not None:
+            candidates.append(self._by_source.get(src, set()))
+        if dst is not None:
+            if method == 'UNICAST':
+                candidates.append(self._by_device.get(dst, set()))
+            elif method == 'MULTICAST':
+                candidates.append(self._by_group.get(dst, set()))
+            else:
+                candidates.append(
+                    self._by_device.get(dst, set()) |
+                    self._by_group.get(dst, set()))
+        if method is not None:
+            candidates.append(self._by_method.get(method, set()))
+
+        if candidates:
+            candidates.sort(key=len)
+            IDs = candidates[0].intersection(*candidates[1:])
+        else:
+            IDs = self._data
+
+        table = self._table
+        return [
+            (ID,) + table.keys(ID) for ID in sorted(IDs, key=table.row)
+        ]
+
+    def _index(self, ID, t):
+        method = t['destination']['address_method']
+        src = t['source']['device']
+        if method == 'UNICAST':
+            dst = t['destination']['device']
+        else:
+            dst = t['destination'].get('multicast_group')
+
+        # the row is written first, an updated traffic keeps its row
+        keys = self._table.keys(ID) if ID in self._table else None
+        self._table.set(ID, method, src, dst, t.get('bandwidth'))
+        if keys is not None:
+            self._unindex(ID, keys)
+
+        by_dst = self._by_device if method == 'UNICAST' else self._by_group
+        by_dst[dst].add(ID)
+        self._by_source[src].add(ID)
+        self._by_method[method].add(ID)
+
+    def _unindex(self, ID, keys=None):
+        method, src, dst = keys or self._table.keys(ID)
+        by_dst = self._by_device if method == 'UNICAST' else self._by_group
+        for index, key in (
+                (self._by_source, src),
+                (by_dst, dst),
+                (self._by_method, method)):
+            index[key].discard(ID)
+            if not index[key]:
+                index.pop(key)
+
+    def _replace(self, ID, t):
+        """Replace the record of a traffic.
+
+        The row of the table is written first, then the indexes, the
+        aggregation and the record, so if the row fails, nothing is changed.
+        """
+        self._index(ID, t)
+        aggregation.update_traffic(ID, t)
+        self._data[ID] = t
+
     @wrap_exception
+    @return_view
     def create(self, query, traffic_type=None):
         """ Create a traffic.
 
@@ -62,14 +220,17 @@ class TrafficManager(SingletonDataManager):
         InitTrafficValidator.validate(query)
 
         logger.info("Initialized traffic %.8s from schema" % ID)
-        configuration = query
+        configuration = TrafficRecord.from_dict(query)
 
+        self._index(ID, configuration)
+        aggregation.add_traffic(ID, configuration)
         self._data[ID] = configuration
         logger.info("Created traffic %.8s" % ID)
 
         return {ID: self._data[ID]}
 
     @wrap_exception
+    @return_view
     def update(self, target, query):
         """ Update a traffic.
 
@@ -107,12 +268,13 @@ class TrafficManager(SingletonDataManager):
         logger.info("Validating query")
         TrafficValidator.validate(query)
 
-        self._data[target] = dict_update(traffic, query, name)
+        self._replace(target, dict_update(traffic, query, name))
         logger.info("Updated parameters above of %s" % name)
 
         return {target: self._data[target]}
 
     @wrap_exception
+    @return_view
     def delete(self, target, query):
         """Delete a traffic. or all traffic.
         Parameters
@@ -137,9 +299,12 @@ class TrafficManager(SingletonDataManager):
         
         if query == {}:
             self._data.pop(target)
+            self._unindex(target)
+            self._table.remove(target)
+            aggregation.remove_traffic(target)
             logger.info("Deleted %s" % name)
             return target
         else:
-            self._data[target] = dict_delete(traffic, query, name)
+            self._replace(target, dict_delete(traffic, query, name))
             logger.info("Cleared parameters above of %s" % name)
             return {target: self._data[target]}
\ No newline at end of file
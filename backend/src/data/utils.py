@@ -1,6 +1,7 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
 from functools import wraps
+from collections.abc import Mapping, Sequence
 from .exceptions import (ProhibitedAccessError, InvalidAccessError,
     WrongTypeAccessError, NonStandardAccessError, CorruptFileError)
 from copy import deepcopy
@@ -82,7 +83,9 @@ def dict_update(raw, new, prefix):
     # would make a shallow copy here. We can use shallow copy instead of deep
     # copy here because dict are updated recursively and lists are treated as a
     # whole. If that condition is violated, we may need a deepcopy version
-    raw_copy = raw.copy()
+    # Records are never modified in place, the updated record shares the
+    # unchanged parts with the raw one, so snapshots of the state stay valid.
+    raw_copy = dict(raw) if isinstance(raw, Record) else raw.copy()
     for k, v in new.items():
         name = '%s->%s' % (prefix, k)
         if k not in raw_copy:
@@ -90,12 +93,16 @@ def dict_update(raw, new, prefix):
         elif not _is_type_equal(raw_copy[k], v):
             raise InvalidAccessError("Unable to update %s, expect %s but got %s" 
                 %(name, raw_copy[k].__class__.__name__, v.__class__.__name__))
-        elif isinstance(raw_copy[k], dict):
+        elif isinstance(raw_copy[k], (dict, Record)):
             raw_copy[k] = dict_update(raw_copy[k], v, name)
         else:
-            raw_copy[k] = v
+            # the caller may still hold the new value
+            raw_copy[k] = deepcopy(v)
 
         logger.info("Able to update %s" % name)
+
+    if isinstance(raw, Record):
+        return raw.replace(**{k: raw_copy[k] for k in new})
     return raw_copy
 
 def dict_delete(raw, query, prefix):
@@ -116,27 +123,29 @@ def dict_delete(raw, query, prefix):
     # would make a shallow copy here. We can use shallow copy instead of deep
     # copy here because dict are updated recursively and lists are treated as a
     # whole. If that condition is violated, we may need a deepcopy version
-    raw_copy = raw.copy()
+    raw_copy = dict(raw) if isinstance(raw, Record) else raw.copy()
     for k, v in query.items():
         name = '%s->%s' % (prefix, k)
         if k not in raw_copy:
             raise InvalidAccessError("Unable to delete %s, key not found" 
                 % (name, k))
         if v is None:
-            if isinstance(raw_copy[k], list):
+            if isinstance(raw_copy[k], (list, tuple)):
                 raw_copy[k] = []
-            elif isinstance(raw_copy[k], dict):
+            elif isinstance(raw_copy[k], (dict, Record)):
                 raise NonStandardAccessError("Unable to delete %s. Expect a "
                     "but got NoneType" % name)
             else:
                 raw_copy[k] = None
-        elif isinstance(raw_copy[k], dict):
+        elif isinstance(raw_copy[k], (dict, Record)):
             raw_copy[k] = dict_delete(raw_copy[k], v, name)
         else:
             raise NonStandardAccessError("Value should be NoneType or dict")
 
         logger.info("Able to delete %s" % name)
 
+    if isinstance(raw, Record):
+        return raw.replace(**{k: raw_copy[k] for k in query})
     return raw_copy
 
 def read_only(getter):
@@ -188,10 +197,166 @@ def wrap_exception(f):
  
     return exception_handler
 
-def return_copy(f):
-    """Decorator to wrap return values of f with deepcopy.
+class ReadOnlyDict(Mapping):
+    """Read-only view of a dict of the internal state.
+
+    Reads go straight to the underlying dict without copying it, and nested
+    dicts/lists are returned as views as well, so a piece of data is write
+    protected by construction. Call copy() to get a mutable deep copy.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        return read_only_view(self._data[key])
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __repr__(self):
+        return repr(self._data)
+
+    def copy(self):
+        return deepcopy(self._data)
+
+class ReadOnlyList(Sequence):
+    """Read-only view of a list of the internal state.
+
+    See ReadOnlyDict.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, index):
+        return read_only_view(self._data[index])
+
+    def __len__(self):
+        return len(self._data)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, ReadOnlyList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self._data)
+
+    def copy(self):
+        return deepcopy(self._data)
+
+class Record(Mapping):
+    """Immutable record with a fixed set of keys.
+
+    Values are stored in __slots__ instead of a dict per record, which saves
+    most of the memory of large tables such as traffic. A record is read like
+    a dict, keys that are not set are simply missing. It is converted to a
+    plain dict by to_dict() where JSON-compatible data is required.
+
+    Derived classes define the keys as __slots__, and _converters maps keys
+    to callables that convert the raw values, e.g. nested records.
+    """
+    __slots__ = ()
+    _converters = {}
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            if key not in self.__slots__:
+                raise KeyError("Unknown key %s of %s"
+                    % (key, type(self).__name__))
+            converter = self._converters.get(key)
+            if converter is not None:
+                value = converter(value)
+            object.__setattr__(self, key, value)
+
+    @classmethod
+    def from_dict(cls, data):
+        return data if isinstance(data, cls) else cls(**data)
+
+    def replace(self, **fields):
+        """New record with some fields replaced.
+
+        The other fields are shared with this record instead of being copied.
+        """
+        record = object.__new__(type(self))
+        for key in self:
+            object.__setattr__(record, key, getattr(self, key))
+        Record.__init__(record, **fields)
+        return record
+
+    def to_dict(self):
+        """Convert the record to a JSON-compatible dict."""
+        return {
+            key: value.to_dict() if isinstance(value, Record) else
+                list(value) if type(value) is tuple else value
+                    for key, value in self.items()
+        }
+
+    copy = to_dict
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.__slots__:
+            if hasattr(self, key):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __setattr__(self, key, value):
+        raise ProhibitedAccessError("Unable to modify %s.%s. Records are "
+            "immutable" % (type(self).__name__, key))
+
+    def __delattr__(self, key):
+        raise ProhibitedAccessError("Unable to delete %s.%s. Records are "
+            "immutable" % (type(self).__name__, key))
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def __reduce__(self):
+        return (type(self).from_dict, (self.to_dict(),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+def read_only_view(obj):
+    """Wrap dicts and lists with read-only views.
+
+    Other values (str, numbers, tuples, ...) are immutable and returned as is.
+    """
+    if isinstance(obj, dict):
+        return ReadOnlyDict(obj)
+    if isinstance(obj, list):
+        return ReadOnlyList(obj)
+    return obj
+
+def return_view(f):
+    """Decorator to wrap return values of f with read-only views.
     
-    Return deepcopy to avoid violations of write protection of a piece of data.
+    Return views instead of copies to avoid violations of write protection of
+    a piece of data, reading through a view copies nothing.
 
     Parameters
     __________
@@ -199,13 +364,13 @@ def return_copy(f):
 
     Returns
     -------
-    deepcopy_wrapper : a callable object / function
-        Wrapper that return a deepcopy of what f returns.
+    view_wrapper : a callable object / function
+        Wrapper that return a read-only view of what f returns.
     """
     @wraps(f)
-    def deepcopy_wrapper(*args, **kwargs):
-        return deepcopy(f(*args, **kwargs))
-    return deepcopy_wrapper
+    def view_wrapper(*args, **kwargs):
+        return read_only_view(f(*args, **kwargs))
+    return view_wrapper
 
 def empty_query(f):
     """Decorator to assert empty query in a method call.
@@ -245,4 +410,12 @@ def _is_type_equal(X, Y):
         return True
     if Y is None:
         return True
-    return type(X) == type(Y)
+    return _json_type(X) == _json_type(Y)
+
+def _json_type(X):
+    # records are stored for dicts, and tuples for lists
+    if isinstance(X, Record):
+        return dict
+    if type(X) is tuple:
+        return list
+    return type(X)
@@ -1,7 +1,7 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
 import xlrd
-from ..common import node, traffic
+from ..common import sm, node, traffic
 from .exceptions import FileLoadError
 
 import logging
@@ -24,6 +24,15 @@ TRAFFIC_DESTINATION_PORT = 8
 TRAFFIC_DESTINATION_IP = 9
 
 def load(file):
+    """Load nodes and traffic from an example spreadsheet.
+
+    The whole file is loaded in a transaction, nothing is changed if any row
+    fails.
+    """
+    with sm.transaction():
+        _load(file)
+
+def _load(file):
     book = xlrd.open_workbook(file)
 
     # register nodes
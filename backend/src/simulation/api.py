@@ -1,15 +1,43 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
-from flask import Blueprint, jsonify, request
+from flask import (
+    Blueprint, Response, abort, json, jsonify, request, stream_with_context)
 from ..utils import unknown_error_handler
 from . import route
-from ..common import DATA_TYPES
+from .cache import route_cache
+from ..common import DATA_TYPES, MAX_SWEEP_WORKERS
 
 import logging
 logger = logging.getLogger(__name__)
 
 api = Blueprint('simulation', __name__)
 
+NDJSON = 'application/x-ndjson'
+
+def parse_failures(arg_dict):
+    # several failed links/nodes are separated by commas, e.g.
+    # flinks=linkID1,linkID2&fnodes=nodeID
+    for k in ('flinks', 'fnodes'):
+        if arg_dict.get(k) is not None:
+            if isinstance(arg_dict[k], str):
+                arg_dict[k] = arg_dict[k].split(',')
+            arg_dict[k] = [ID for ID in arg_dict[k] if ID]
+
+def valid_failures(arg_dict):
+    # a failed link/node is an ID, several of them are IDs separated by commas
+    # or a list of IDs, all of them could be null
+    for k in ('flink', 'fnode'):
+        if not isinstance(arg_dict.get(k), (str, type(None))):
+            return False
+    for k in ('flinks', 'fnodes'):
+        v = arg_dict.get(k)
+        if isinstance(v, list):
+            if not all(isinstance(ID, str) for ID in v):
+                return False
+        elif not isinstance(v, (str, type(None))):
+            return False
+    return True
+
 @api.route("/routes", methods=['GET'])
 @unknown_error_handler
 def query_route():
@@ -20,9 +48,38 @@ def query_route():
     arg_dict.update({
         k+'ID': arg_dict.pop(k) for k in DATA_TYPES if k in arg_dict
     })
+    parse_failures(arg_dict)
+    # routes are streamed as newline delimited JSON if the client asks for it,
+    # each of them is sent as soon as it is walked
+    if request.accept_mimetypes.best_match(
+            ['application/json', NDJSON]) == NDJSON:
+        routes = route.iter_routes(**arg_dict)
+        return Response(
+            stream_with_context(json.dumps(r) + '\n' for r in routes),
+            mimetype=NDJSON), 200
     routes = route.query_routes(**arg_dict)
     return jsonify(routes), 200
 
+@api.route("/routes/batch", methods=['POST'])
+@unknown_error_handler
+def query_route_batch():
+    # a list of queries, each of them has the same arguments as GET /routes,
+    # and flinks/fnodes could also be lists
+    specs = request.json
+    if not isinstance(specs, list):
+        abort(400)
+    for arg_dict in specs:
+        if not isinstance(arg_dict, dict) or not valid_failures(arg_dict):
+            abort(400)
+    logger.info('Initiate route query with %d specs' % len(specs))
+    for arg_dict in specs:
+        arg_dict.update({
+            k+'ID': arg_dict.pop(k) for k in DATA_TYPES if k in arg_dict
+        })
+        parse_failures(arg_dict)
+    results = route.query_routes_batch(specs)
+    return jsonify(results), 200
+
 @api.route("/bandwidth", methods=['GET'])
 @unknown_error_handler
 def query_bw():
@@ -33,5 +90,23 @@ def query_bw():
     arg_dict.update({
         k+'ID': arg_dict.pop(k) for k in DATA_TYPES if k in arg_dict
     })
+    parse_failures(arg_dict)
+    if 'sweep' in arg_dict:
+        arg_dict['sweep'] = arg_dict['sweep'].lower() in ('1', 'true')
+    if 'workers' in arg_dict:
+        try:
+            workers = int(arg_dict['workers'])
+        except ValueError:
+            abort(400)
+        if workers < 0:
+            abort(400)
+        arg_dict['workers'] = min(workers, MAX_SWEEP_WORKERS)
     bw = route.query_bws(**arg_dict)
-    return jsonify(bw), 200
\ No newline at end of file
+    return jsonify(bw), 200
+
+
+@api.route("/cache", methods=['GET'])
+@unknown_error_handler
+def query_cache():
+    # hit/miss statistics of the route cache
+    return jsonify(route_cache.info()), 200
@@ -0,0 +1,67 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+import heapq
+
+import logging
+logger = logging.getLogger(__name__)
+
+class BucketQueue(object):
+    """Monotone priority queue of the Dijkstra Algorithm.
+
+    Items are tuples of ((cost, ...), from_node, ...), where cost is the
+    number of hops to the root. Costs are small integers and never lower than
+    the cost of the last popped item, so items are put into one bucket per
+    cost instead of a heap. A bucket is sorted only when it becomes current,
+    then its items are popped in order. Items are popped in exactly the same
+    order as a heap of them.
+
+    Like the heap, an item is dropped lazily if its source node is traversed
+    when it is popped.
+    """
+    def __init__(self, root):
+        self.traversed = {root} # root is already traversed
+        # cost -> items that are not sorted yet
+        self._buckets = {}
+        # items of the current cost sorted in reverse order, so the next one
+        # is popped from the end
+        self._cost = None
+        self._current = []
+        # heap of items pushed at the current cost by zero weight links
+        self._ties = []
+
+    def push(self, item):
+        from_node = item[1]
+        if from_node in self.traversed:
+            return
+        cost = item[0][0]
+        if self._cost is not None and cost <= self._cost:
+            if cost < self._cost:
+                raise ValueError(
+                    "Cost %s is lower than the current one %s"
+                    % (cost, self._cost))
+            heapq.heappush(self._ties, item)
+            return
+        bucket = self._buckets.get(cost)
+        if bucket is None:
+            self._buckets[cost] = [item]
+        else:
+            bucket.append(item)
+
+    def pop(self):
+        traversed = self.traversed
+        current, ties = self._current, self._ties
+        while current or ties or self._buckets:
+            if not current and not ties:
+                self._cost = min(self._buckets)
+                current = self._current = self._buckets.pop(self._cost)
+                current.sort(reverse=True)
+
+            if ties and (not current or ties[0] < current[-1]):
+                item = heapq.heappop(ties)
+            else:
+                item = current.pop()
+            from_node = item[1]
+            if from_node not in traversed:
+                traversed.add(from_node)
+                return item
+        return None
@@ -0,0 +1,151 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+class RouteCache(object):
+    """Bounded LRU cache of route solutions.
+
+    Solutions are only valid for the generation of the internal state they are
+    computed from. Whenever a newer generation is queried, all the cached
+    solutions are dropped, so the cache never returns stale routes. Solutions
+    of an older generation, e.g. of a request that began before the latest
+    WRITE operation, are computed but never cached.
+
+    Solutions are computed outside the lock of the cache, so hits never wait
+    for a solution being computed. Concurrent misses of the same key wait for
+    a single computation.
+    """
+    def __init__(self, maxsize=64):
+        """
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of solutions kept for a generation.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._generation = None
+        self._entries = OrderedDict()
+        # (generation, key) -> Future of a solution being computed
+        self._pending = {}
+        # the lock only guards the bookkeeping above
+        self._lock = threading.Lock()
+
+    def get(self, generation, key, factory):
+        """Get a cached solution, compute it if it is missing.
+
+        Parameters
+        ----------
+        generation : tuple
+            Generation of what the solutions depend on, a tuple of counters
+            that never decrease, e.g. versions of the topology and traffic.
+
+        key : tuple
+            Key of the solution, e.g. (kind, disabled_link, disabled_node).
+
+        factory : a callable object / function without arguments
+            Function that computes the solution.
+
+        Returns
+        -------
+        solution : object
+            What factory returns.
+        """
+        with self._lock:
+            stale = self._is_older(generation)
+            if stale:
+                self.misses += 1
+            else:
+                if generation != self._generation:
+                    self._entries.clear()
+                    self._generation = generation
+
+                if key in self._entries:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+
+                future = self._pending.get((generation, key))
+                owner = future is None
+                if owner:
+                    self.misses += 1
+                    future = self._pending[generation, key] = Future()
+
+        if stale:
+            logger.debug("Computing route solution %s of an older generation"
+                % (key,))
+            return factory()
+
+        if not owner:
+            # another thread is computing it
+            return future.result()
+
+        try:
+            solution = factory()
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop((generation, key))
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._pending.pop((generation, key))
+            # the generation may have changed during the computation, then the
+            # solution is still returned to its callers but not cached
+            if generation == self._generation:
+                self._entries[key] = solution
+                if len(self._entries) > self.maxsize:
+                    evicted, _ = self._entries.popitem(last=False)
+                    logger.debug("Evicted route solution %s" % (evicted,))
+        future.set_result(solution)
+        return solution
+
+    def _is_older(self, generation):
+        """Whether a generation is older than the one of the cache."""
+        return self._generation is not None and any(
+            g < c for g, c in zip(generation, self._generation))
+
+    def peek(self, generation, key):
+        """Get a cached solution without computing it.
+
+        Returns
+        -------
+        solution : object or None
+            The cached solution, None if it is missing.
+        """
+        with self._lock:
+            if generation != self._generation or key not in self._entries:
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def discard(self, generation, key):
+        """Drop a cached solution if it exists."""
+        with self._lock:
+            if generation == self._generation:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation = None
+
+    def info(self):
+        """Statistics of the cache."""
+        return {
+            'generation': self._generation,
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+# cache shared by all the route queries
+route_cache = RouteCache()
@@ -1,9 +1,12 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
-import heapq
+from array import array
 from collections import defaultdict
+import threading
 from boltons.dictutils import OrderedMultiDict
-from ..common import node, multicast_group
+from ..common import multicast_group
+from .bucket_queue import BucketQueue
+from .layered import LayeredTrees
 import pprint
 
 import logging
@@ -13,40 +16,27 @@ logger = logging.getLogger(__name__)
 INFTY = float('inf')
 
 class GlobalPolicySimulation(object):
-    def __init__(self, adj, utraffic, mtraffic, dst_src_combination):
-        """ Initiliza the graph with adjacent matrix and total node count.
+    def __init__(self, graph, utraffic, mtraffic, dst_src_combination,
+            groups=None):
+        """ Initiliza the graph with compiled topology and clustered traffic.
 
         Parameters
         ----------
-        adj : dict
-            Adjacent matrix of a directed graph.
-            It is represented as a mapping, where the value is a list of tuples
-            that represent different links and the key is the node that all the
-            links in the list go toward.
-            The structure is like:
-            {
-                to: [
-                    (
-                        hop, 
-                        from, to, 
-                        speed, 
-                        from_port, from_port_bit, to_port, to_port_bit, 
-                        linkID
-                    )
-                ]
-            }
-            It could also be considered as:
-            {
-                from: [
-                    (
-                        hop, 
-                        to, from, 
-                        speed, 
-                        to_port, to_port_bit, from_port, from_port_bit, 
-                        linkID
-                    )
-                ]
-            }
+        graph : CompiledGraph
+            Topology of the internal state compiled to integer indexed arrays.
+            It represents a directed graph, where links that go toward node v
+            are stored between graph.offsets[v] and graph.offsets[v+1] of the
+            link arrays. Each array is a column of the adjacency:
+            (
+                hop (weights),
+                from (neighbors), to (the row itself),
+                speed (speeds),
+                from_port (neighbor_ports), from_port_bit (neighbor_port_bits),
+                to_port (ports), to_port_bit (port_bits),
+                linkID (links)
+            )
+            Since the graph is undirected, it could also be considered as links
+            that come from node v.
         utraffic : dict
             Clustered traffic dictionary for UNICAST.
             All the traffic clustered first by destination, then source.
@@ -79,17 +69,62 @@ class GlobalPolicySimulation(object):
         dst_src_combination: dict
             A mapping from destination to all the sources that send traffic to
             it, including both UNICAST and MULTICAST.
+        groups: dict
+            Mapping from multicast group ID to its devices. Devices are read
+            from the multicast group manager if it is not given, which is not
+            available in worker processes.
         """
-        self.adj = adj
+        self.graph = graph
+        self.eth_nodes = graph.eth_nodes
         self.utraffic = utraffic
         self.mtraffic = mtraffic
         self.dst_src_combination = dst_src_combination
-        self.switches = {
-            nodeID for nodeID, n in node.items() 
-                if n['type'] == 'SWITCH'
-        }
+        self.switches = graph.switches
+        self.groups = groups
+        # failure scenarios are solved in place, get_overview() takes the lock
+        # so that it could be called from multiple threads
+        self._lock = threading.Lock()
+        self._init_masks()
         self.gen_connected_components()
+        self.gen_full_trees()
         self.primary_routes = self.gen_routes()
+        self.primary_trees = self.shortest_route_trees
+        self.index_primary_routes()
+
+    def __getstate__(self):
+        """Compact snapshot sent to worker processes.
+
+        Temporary variables of the Tarjan Algorithm and bitmaps are dropped,
+        and devices of multicast groups are copied since the multicast group
+        manager is not available in worker processes. The connected components
+        and categories are kept, so workers never traverse the graph again.
+        """
+        state = {
+            k: v for k, v in self.__dict__.items()
+                if not k.startswith('_') and k != 'shortest_route_trees'
+        }
+        if state['groups'] is None:
+            state['groups'] = {
+                mgID: list(multicast_group[mgID]['devices'])
+                    for mgID in self.mtraffic
+            }
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._init_masks()
+
+    def _init_masks(self):
+        """Allocate bitmaps of masked traversal once.
+
+        While a subtree is repaired, 1 in _growable marks nodes that the
+        subtree could grow to, and 1 in _disabled_links marks links that are
+        disabled. Both bitmaps are cleared after each repair, so failure
+        scenarios never allocate anything proportional to the graph size.
+        """
+        self._growable = bytearray(len(self.graph))
+        self._disabled_links = bytearray(len(self.graph.link_ids))
 
     def gen_connected_components(self):
         """
@@ -100,24 +135,27 @@ class GlobalPolicySimulation(object):
         # ----- temporary variables
         # temp: endpoints haven't been traversed
         self._tmp_untraversed = self.switches.copy()
-        # temp: order of a node in the DFS
-        self._tmp_order = defaultdict(lambda: INFTY)
+
+        # status of the DFS is kept in arrays indexed by interned nodes
+        # temp: order of a node in the DFS, -1 if it is not traversed
+        self._tmp_order = [-1] * len(self.graph)
         # temp: the lowest depth a node is connected to
-        self._tmp_low = defaultdict(lambda: INFTY)
-        # temp: parent of a node in the DFS
-        self._tmp_parent = defaultdict(lambda: -1)
+        self._tmp_low = [-1] * len(self.graph)
+        # temp: parent of a node in the DFS, -1 if it is DFS_ROOT
+        self._tmp_parent = [-1] * len(self.graph)
 
         # Initialize every ETH node with a distinct number
-        node_connected_components = OrderedMultiDict(
-            (nodeID, i) for i, (nodeID, n) in enumerate(node.items())
-            if n['protocol'] == 'ETH')
+        # nodeID -> ID of its connected component
+        node_connected_components = {
+            nodeID: i for i, nodeID in enumerate(self.eth_nodes)
+        }
 
         link_connected_components = OrderedMultiDict()
 
         # Initialize every ETH non-switch as type 2
         entity_type = OrderedMultiDict(
-            (nodeID, 't2') for nodeID, n in node.items()
-            if n['type'] != 'SWITCH' and n['protocol'] == 'ETH')
+            (nodeID, 't2') for nodeID, node_type in self.eth_nodes.items()
+            if node_type != 'SWITCH')
 
         while self._tmp_untraversed:
             # temp: all links of a connected components
@@ -266,9 +304,6 @@ class GlobalPolicySimulation(object):
             # temp: type 3 cut endpoints
             self._tmp_type3_nodes = set()
 
-            # order counter
-            self.__order = 0 
-
             # randomly choose an endpoint as DFS root
             DFS_ROOT = self._tmp_untraversed.pop()
 
@@ -308,51 +343,99 @@ class GlobalPolicySimulation(object):
 
             self._tmp_untraversed -= self._tmp_nodes
 
+        # ID of connected component -> IDs of its nodes
+        component_members = defaultdict(set)
+        for nodeID, ccID in node_connected_components.items():
+            component_members[ccID].add(nodeID)
+
         self.node_connected_components = node_connected_components
+        self.component_members = dict(component_members)
         self.link_connected_components = link_connected_components
         self.entity_type = entity_type
 
     def bridge_update(self, nodeID):
-        """Update a node status
+        """Traverse a connected component and update status of its nodes.
+
+        The DFS keeps an explicit stack instead of recursion, so it works on
+        long chains of any length. Every node is updated in the same order as
+        a recursive DFS.
+
         Parameters
         ----------
         nodeID : str
-            ID of the node being traversed.
+            ID of DFS_ROOT.
         """
-
+        order = self._tmp_order
+        low = self._tmp_low
+        parent = self._tmp_parent
+        node_ids = self.graph.node_ids
+        link_ids = self.graph.link_ids
+        offsets = self.graph.offsets
+        neighbors = self.graph.neighbors
+        links = self.graph.links
+
+        # order counter
+        counter = 0
+        root = self.graph.node_index[nodeID]
+        order[root] = low[root] = counter
         self._tmp_nodes.add(nodeID)
 
-        self._tmp_order[nodeID] = self.__order
-        self._tmp_low[nodeID] = self.__order
+        # frames of the DFS: [node, position of the next link, child orders]
+        stack = [[root, offsets[root], []]]
+        while stack:
+            frame = stack[-1]
+            node, k, child_orders = frame
+
+            # traverse the next child
+            if k < offsets[node+1]:
+                frame[1] += 1
+                child = neighbors[k]
+                self._tmp_links.add(link_ids[links[k]])
+
+                # not traversed, status of the node is updated after the
+                # child is done
+                if order[child] == -1:
+                    counter += 1
+                    parent[child] = node
+                    order[child] = low[child] = counter
+                    self._tmp_nodes.add(node_ids[child])
+                    stack.append([child, offsets[child], []])
+                    continue
 
-        child_orders = []
+                if child != parent[node]:
+                    low[node] = min(low[child], low[node])
 
-        # traverse every child
-        for _, child, _, _, _, _, _, _, linkID in self.adj[nodeID]:
-            self._tmp_links.add(linkID)
+                if low[child] > order[node]:
+                    self._tmp_type2_links.add(link_ids[links[k]])
+                continue
 
-            # not traversed
-            if self._tmp_order[child] == INFTY:
-                self.__order += 1
-                self._tmp_parent[child] = nodeID
-                self.bridge_update(child)
-                self._tmp_low[nodeID] = min(
-                    self._tmp_low[child], self._tmp_low[nodeID]
-                )
+            # every child is traversed
+            stack.pop()
+            self._categorize_node(node, child_orders)
 
-                child_orders.append(
-                    cmp(self._tmp_low[child], self._tmp_order[nodeID])
-                )
+            if stack:
+                # update the parent with the link just traversed
+                frame = stack[-1]
+                linkID = links[frame[1] - 1]
+                low[frame[0]] = min(low[node], low[frame[0]])
+                frame[2].append(cmp(low[node], order[frame[0]]))
+                if low[node] > order[frame[0]]:
+                    self._tmp_type2_links.add(link_ids[linkID])
 
-            elif child != self._tmp_parent[nodeID]:
-                self._tmp_low[nodeID] = min(
-                    self._tmp_low[child], self._tmp_low[nodeID]
-                )
+    def _categorize_node(self, node, child_orders):
+        """Categorize a node after all of its children are traversed.
 
-            if self._tmp_low[child] > self._tmp_order[nodeID]:
-                self._tmp_type2_links.add(linkID)
+        Parameters
+        ----------
+        node : int
+            Index of the node.
 
-        if self._tmp_parent[nodeID] != -1:
+        child_orders : list
+            Comparison between the lowest depth of each child and the order of
+            the node.
+        """
+        nodeID = self.graph.node_ids[node]
+        if self._tmp_parent[node] != -1:
             # endpoint is not DFS_ROOT
             if all(order == -1 for order in child_orders):
                 self._tmp_type1_nodes.add(nodeID)
@@ -369,9 +452,15 @@ class GlobalPolicySimulation(object):
             else:
                 self._tmp_type3_nodes.add(nodeID)
 
-    def gen_routes(self, disabled_link=None, disabled_node=None):
+    def gen_routes(self, disabled_link=None, disabled_node=None,
+            disabled_links=(), disabled_nodes=()):
         """Get shortest route trees start from all destinations.
 
+        Several links/nodes could be disabled together, e.g. links of a shared
+        risk group. Type II links/nodes never require new routes, so routes
+        are only recomputed for the other ones, and only trees that go through
+        one of them are recomputed.
+
         Parameters:
         disabled_link : str
             Link ID of disabled link.
@@ -379,46 +468,156 @@ class GlobalPolicySimulation(object):
         disabled_node : int
             Node ID of disabled node.
 
+        disabled_links : iterable
+            Link IDs of other disabled links.
+
+        disabled_nodes : iterable
+            Node IDs of other disabled nodes.
+
         Returns 
         -------
         routes : dict
             Mapping from target to multiple routes.
         """
+        disabled_links = failure_set(disabled_link, disabled_links)
+        disabled_nodes = failure_set(disabled_node, disabled_nodes)
+
+        if not disabled_links and not disabled_nodes:
+            self.shortest_route_trees = {
+                dst: self.get_shortest_route_tree(
+                    dst
+                ) for dst in self.dst_src_combination
+            }
 
-        if disabled_link is not None and disabled_node is not None:
-            raise Exception('TBD')
-
-        if disabled_link is not None:
-            if self.entity_type[disabled_link] == 't2':
-                return self.primary_routes
-
-        if disabled_node is not None:
-            if self.entity_type[disabled_node] == 't2':
-                return self.primary_routes
-
-        self.shortest_route_trees = {
+            routes = {
+                udst: self.get_unicast_global_routes(
+                    udst
+                ) for udst in self.utraffic
+            }
+            routes.update({
+                mdst: self.get_multicast_global_routes(
+                    mdst
+                ) for mdst in self.mtraffic
+            })
+            return routes
+
+        disabled_links = frozenset(
+            linkID for linkID in disabled_links
+                if self.entity_type[linkID] != 't2')
+        disabled_nodes = frozenset(
+            nodeID for nodeID in disabled_nodes
+                if self.entity_type[nodeID] != 't2')
+        if not disabled_links and not disabled_nodes:
+            return self.primary_routes
+
+        # only trees and routes that go through the disabled links/nodes are
+        # recomputed, the others are the primary ones
+        disabled = disabled_links | disabled_nodes
+        dsts = set().union(*(self.tree_users.get(e, ()) for e in disabled))
+        mgIDs = set().union(*(self.group_users.get(e, ()) for e in disabled))
+
+        self.shortest_route_trees = dict(self.primary_trees)
+        self.shortest_route_trees.update({
             dst: self.get_shortest_route_tree(
                 dst,
-                disabled_link = disabled_link,
-                disabled_node = disabled_node
-            ) for dst in self.dst_src_combination
-        }
+                disabled_links = disabled_links,
+                disabled_nodes = disabled_nodes
+            ) for dst in dsts
+        })
 
-        routes = {
+        routes = dict(self.primary_routes)
+        routes.update({
             udst: self.get_unicast_global_routes(
                 udst
-            ) for udst in self.utraffic
-        }
+            ) for udst in dsts if udst in self.utraffic
+        })
         routes.update({
             mdst: self.get_multicast_global_routes(
                 mdst
-            ) for mdst in self.mtraffic
+            ) for mdst in mgIDs
         })
         return routes
 
-    def get_shortest_route_tree(self, 
-            dst, disabled_link=None, disabled_node=None):
-        """Get the shortest route tree with Dijkstra Algorithm.
+    def index_primary_routes(self):
+        """Index destinations by links/nodes that their primary routes use.
+
+        A failure only changes trees that go through the failed link/node, and
+        a multicast route only changes if the route from its source to some
+        of the devices goes through it.
+        """
+        # link/node ID -> destinations whose shortest route tree uses it
+        self.tree_users = defaultdict(set)
+        # link/node ID -> multicast groups whose route uses it
+        self.group_users = defaultdict(set)
+
+        for dst, tree in self.primary_trees.items():
+            self.tree_users[dst].add(dst)
+            for from_node, (_, linkID) in tree.items():
+                self.tree_users[from_node].add(dst)
+                self.tree_users[linkID].add(dst)
+
+        for mgID in self.mtraffic:
+            for from_node, hops in self.primary_routes[mgID].items():
+                self.group_users[from_node].add(mgID)
+                for to_node, linkID in hops:
+                    self.group_users[to_node].add(mgID)
+                    self.group_users[linkID].add(mgID)
+
+    def gen_full_trees(self):
+        """Get shortest route trees that span every reachable node.
+
+        Full trees are kept along with the primary routes, so a failure
+        scenario only needs to repair the part of a tree that hangs below the
+        failed link/node. Each tree is a tuple of arrays indexed by interned
+        nodes, -1 if the node is not reachable:
+            - dist: cost from each node to the destination
+            - parent: parent of each node
+            - parent_link: link from each node to its parent
+            - first_child: one of the children of each node
+            - next_sibling: next child of the parent of each node
+
+        If every link costs one hop, trees are grown layer by layer, otherwise
+        by Dijkstra Algorithm. Both give identical trees.
+        """
+        n = len(self.graph)
+        self.full_trees = {}
+
+        if LayeredTrees.applicable(self.graph):
+            layered = LayeredTrees(self.graph)
+            for dst in self.dst_src_combination:
+                self.full_trees[dst] = layered.grow(
+                    self.graph.node_index[dst])
+            return
+
+        for dst in self.dst_src_combination:
+            dist = array('i', [-1]) * n
+            parent = array('i', [-1]) * n
+            parent_link = array('i', [-1]) * n
+            first_child = array('i', [-1]) * n
+            next_sibling = array('i', [-1]) * n
+
+            root = self.graph.node_index[dst]
+            dist[root] = 0
+
+            pq = BucketQueue(root)
+            self._push_links(pq, root, 0)
+            for cost, from_node, (to_node, linkID) in self._grow_tree(pq):
+                dist[from_node] = cost
+                parent[from_node] = to_node
+                parent_link[from_node] = linkID
+                next_sibling[from_node] = first_child[to_node]
+                first_child[to_node] = from_node
+
+            self.full_trees[dst] = (
+                dist, parent, parent_link, first_child, next_sibling)
+
+    def get_shortest_route_tree(self, dst, disabled_link=None,
+            disabled_node=None, disabled_links=(), disabled_nodes=()):
+        """Get the shortest route tree of a destination.
+
+        The primary tree is pruned from the full tree. When links/nodes are
+        disabled, the primary tree is reused if none of them is on it,
+        otherwise only the subtrees below them are recomputed.
 
         Parameters
         ----------
@@ -431,58 +630,135 @@ class GlobalPolicySimulation(object):
         disabled_node : str
             Node ID of disabled node.
 
+        disabled_links : iterable
+            Link IDs of other disabled links.
+
+        disabled_nodes : iterable
+            Node IDs of other disabled nodes.
+
         Returns
         -------
         tree : dict
             Mapping from each node to its parent and actual link ID.
         """
-        tree = {}
-        tree_nodes = set()
+        disabled_links = failure_set(disabled_link, disabled_links)
+        disabled_nodes = failure_set(disabled_node, disabled_nodes)
+
+        # the destination itself is down, no traffic could reach it
+        if dst in disabled_nodes:
+            return {}
+
+        graph = self.graph
+        dist, parent, parent_link, first_child, next_sibling = \
+            self.full_trees[dst]
+
+        if not disabled_links and not disabled_nodes:
+            return self._prune_tree(dst, parent, parent_link)
+
+        # roots of the subtrees that are cut off by the disabled links/nodes
+        primary_tree = self.primary_trees[dst]
+        failed_nodes = [graph.node_index[nodeID] for nodeID in disabled_nodes]
+        failed_links = [
+            graph.link_index[linkID] for linkID in disabled_links
+                if linkID in graph.link_index
+        ]
+        roots = list(failed_nodes)
+        for failed_link in failed_links:
+            for node in graph.link_ends[2*failed_link:2*failed_link+2]:
+                if parent_link[node] == failed_link:
+                    roots.append(node)
+
+        # the primary tree does not go through the disabled links/nodes, and
+        # none of the sources are in the subtrees
+        if all(graph.node_ids[root] not in primary_tree for root in roots):
+            return primary_tree
+
+        # subtrees without sources are regrown as well, since other subtrees
+        # should not grow through them
+        subtree = set()
+        stack = roots
+        while stack:
+            node = stack.pop()
+            if node in subtree:
+                continue
+            subtree.add(node)
+            child = first_child[node]
+            while child != -1:
+                stack.append(child)
+                child = next_sibling[child]
+
+        # nodes outside the subtrees keep their cost and parent, so the
+        # subtrees are regrown from links that connect them with the rest of
+        # the tree
+        nodes = subtree.difference(failed_nodes)
+        boundary = {
+            graph.neighbors[k]
+                for node in nodes
+                for k in range(graph.offsets[node], graph.offsets[node+1])
+                if graph.neighbors[k] not in subtree and
+                    dist[graph.neighbors[k]] != -1
+        }
 
-        ccID = self.node_connected_components[dst]
-        cc_nodes = set(self.node_connected_components.inverted().getlist(ccID))
+        growable = self._growable
+        disabled = self._disabled_links
+        for node in nodes:
+            growable[node] = 1
+        for failed_link in failed_links:
+            disabled[failed_link] = 1
+        try:
+            pq = BucketQueue(graph.node_index[dst])
+            for node in boundary:
+                self._push_links(pq, node, dist[node], masked=True)
+
+            repaired = {
+                from_node: path for _, from_node, path
+                    in self._grow_tree(pq, masked=True)
+            }
+        finally:
+            for node in nodes:
+                growable[node] = 0
+            for failed_link in failed_links:
+                disabled[failed_link] = 0
 
-        srcs = self.dst_src_combination[dst] & cc_nodes
+        return self._prune_tree(dst, parent, parent_link, subtree, repaired)
 
-        pq = PriorityQueue(dst)
+    def _push_links(self, pq, to_node, cost, masked=False):
+        """Push all links that go to a node into the priority queue.
 
-        if disabled_node is not None:
-            # remove the disabled endpoint from the graph
-            adj = {
-                to_node: [
-                    link_info for link_info in links 
-                        if link_info[1] != disabled_node
-                ] for to_node, links in self.adj.items() 
-                    if to_node != disabled_node
-            }
-        else:
-            adj = self.adj
-
-        
-        if disabled_link is not None:
-            # remove the disabled link from the graph
-            adj = {
-                to_node: [
-                    link_info for link_info in links 
-                        if link_info[-1] != disabled_link
-                ] for to_node, links in self.adj.items() 
-                    if to_node != disabled_link
-            }
+        Parameters
+        ----------
+        pq : BucketQueue
+            Priority queue of the Dijkstra Algorithm.
 
+        to_node : int
+            Index of the node, its cost is already determined.
+
+        cost : int
+            Cost from the node to the destination.
+
+        masked : bool
+            Whether links are masked by the bitmaps, only links that come from
+            growable nodes and are not disabled are pushed if it is True.
+        """
         # ------------ Note of the Algorithm ------------    
         # We will treat the graph as a directed graph, even though it is
         # actually an undirected graph, because dijkstra is a greedy search
         # algorithm which accidentally achieves global optimum. That way, the
         # other direction will be disposed and will not affect the algorithm.
-
-        # Initialize the priority queue
-        for (
-                weight, 
-                from_node, to_node, 
-                speed, 
-                from_port, from_port_bit, to_port, to_port_bit,
-                linkID
-            ) in adj[dst]:
+        graph = self.graph
+        growable = self._growable
+        disabled_links = self._disabled_links
+        begin, end = graph.offsets[to_node], graph.offsets[to_node+1]
+        for from_node, linkID, weight, speed, to_port_bit in zip(
+                graph.neighbors[begin:end],
+                graph.links[begin:end],
+                graph.weights[begin:end],
+                graph.speeds[begin:end],
+                graph.port_bits[begin:end]):
+
+            if masked and (
+                    not growable[from_node] or disabled_links[linkID]):
+                continue
 
             pq.push(
                 (
@@ -490,7 +766,7 @@ class GlobalPolicySimulation(object):
                     #   weight (lower first)
                     #   speed (higher first)
                     #   inbound port (lower first)
-                    (weight, -speed, to_port_bit), 
+                    (weight+cost, -speed, to_port_bit), 
                     # source node
                     from_node,
                     # destination node and linkID
@@ -498,52 +774,93 @@ class GlobalPolicySimulation(object):
                 )
             )
 
-        while srcs:
+    def _grow_tree(self, pq, masked=False):
+        """Run Dijkstra Algorithm until the priority queue is exhausted.
+
+        The parent of a node only depends on costs of its neighbors, so a tree
+        grown from any part of the graph is identical to the same part of a
+        tree grown from the destination.
+
+        Parameters
+        ----------
+        pq : BucketQueue
+            Priority queue of the Dijkstra Algorithm.
+
+        masked : bool
+            Whether links are masked by the bitmaps, see _push_links().
+
+        Yields
+        ------
+        cost, node, (parent, link) : tuple
+            Nodes in the order they are reached.
+        """
+        while True:
             l = pq.pop()
             if l is None:
-                # If some of the destinations are not reachable, then the loop
-                # terminates
-                break
+                return
             (cost, _, _), from_node, path = l
-            tree[from_node] = path
-    
-            # if get an source
-            if from_node in srcs:
-                srcs.remove(from_node)
-
-                # add all the parent nodes to the set
-                while from_node not in tree_nodes and from_node != dst:
-                    tree_nodes.add(from_node)
-                    from_node, _ = tree[from_node]
+            yield cost, from_node, path
 
             # now the source becomes the new destination
             # add all links that go to the source to the priority queue
-            new_dst = from_node
-            for (
-                weight, 
-                from_node, to_node, 
-                speed, 
-                from_port, from_port_bit, to_port, to_port_bit,
-                linkID
-            ) in adj[new_dst]:
-                pq.push(
-                    (
-                        # order of links: 
-                        #   weight (lower first)
-                        #   speed (higher first)
-                        #   inbound port (lower first)
-                        (weight+cost, -speed, to_port_bit), 
-                        # source node
-                        from_node,
-                        # destination node and linkID
-                        (to_node, linkID),
-                    )
-                )
+            self._push_links(pq, from_node, cost, masked)
 
-        tree = {
-            from_node: path 
-                for from_node, path in tree.items() if from_node in tree_nodes
-        }
+    def _prune_tree(self, dst, parent, parent_link, subtree=(), repaired=None):
+        """Keep only the routes from sources of the destination.
+
+        Parameters
+        ----------
+        dst : str
+            ID of destination node, which is the root of the tree.
+
+        parent : array
+            Parent of each node in the full tree.
+
+        parent_link : array
+            Link from each node to its parent in the full tree.
+
+        subtree : set
+            Nodes whose parents are replaced by the repaired ones.
+
+        repaired : dict
+            Mapping from each node of the subtree to its new parent and link.
+            Nodes of the subtree that are missing are not reachable.
+
+        Returns
+        -------
+        tree : dict
+            Mapping from each node to its parent and actual link ID.
+        """
+        ccID = self.node_connected_components[dst]
+        srcs = self.dst_src_combination[dst] & self.component_members[ccID]
+
+        node_ids = self.graph.node_ids
+        link_ids = self.graph.link_ids
+        root = self.graph.node_index[dst]
+
+        tree = {}
+        traversed = set()
+        for src in srcs:
+            from_node = self.graph.node_index[src]
+
+            # add all the parent nodes to the tree
+            while from_node not in traversed and from_node != root:
+                if from_node in subtree:
+                    path = repaired.get(from_node)
+                elif parent[from_node] != -1:
+                    path = (parent[from_node], parent_link[from_node])
+                else:
+                    path = None
+
+                # the source is not reachable
+                if path is None:
+                    break
+
+                to_node, linkID = path
+                traversed.add(from_node)
+                tree[node_ids[from_node]] = (
+                    node_ids[to_node], link_ids[linkID])
+                from_node = to_node
 
         return tree
 
@@ -579,7 +896,10 @@ class GlobalPolicySimulation(object):
                 - next hop node
                 - linkID
         """
-        dsts = multicast_group[mgID]['devices']
+        if self.groups is not None:
+            dsts = self.groups[mgID]
+        else:
+            dsts = multicast_group[mgID]['devices']
         tree = defaultdict(set)
 
         # a multicast group should only have one traffic, so although we don't
@@ -604,7 +924,11 @@ class GlobalPolicySimulation(object):
         return tree
 
 
-    def get_overview(self, disabled_link=None, disabled_node=None):
+    def get_overview(self, disabled_link=None, disabled_node=None,
+            disabled_links=(), disabled_nodes=()):
+        disabled_links = failure_set(disabled_link, disabled_links)
+        disabled_nodes = failure_set(disabled_node, disabled_nodes)
+
         overview = defaultdict(
             lambda: defaultdict(
                 lambda: {'traffic': [], 'bandwidth': 0.0}))
@@ -612,81 +936,120 @@ class GlobalPolicySimulation(object):
         # if disabled_node is None and disabled_link is None:
         #     routes = self.primary_routes
         # else:
-        routes = self.gen_routes(
-            disabled_link=disabled_link, 
-            disabled_node=disabled_node)
+        # only solving modifies the simulation, the routes are never modified
+        # once they are returned
+        with self._lock:
+            routes = self.gen_routes(
+                disabled_links=disabled_links, 
+                disabled_nodes=disabled_nodes)
 
         for dst, srcs in self.utraffic.items():
-            shortest_route_tree = routes[dst]
-
             for src, traffic_info in srcs.items():
-                # source may be in a different connected component
-                if src not in shortest_route_tree:
-                    continue
-                from_node = src
-
-                while from_node != dst:
-                    to_node, linkID = shortest_route_tree[from_node]
-
-                    if to_node == disabled_node or linkID == disabled_link:
-                        break
-                    
+                for linkID, from_node, to_node in walk_links(
+                        routes[dst], 'UNICAST', dst, src,
+                        disabled_links, disabled_nodes):
                     l = overview[linkID][from_node, to_node]
                     l['traffic'] += traffic_info['traffic']
                     l['bandwidth'] += traffic_info['bandwidth']
 
-                    from_node = to_node
-
         for mgID, srcs in self.mtraffic.items():
-            shortest_route_tree = routes[mgID]
-
             # a multicast group should only have one traffic, so although we 
             # don't add any validation before this statement, it should work 
             # well if an excepetion occurs here, that means the validation that 
             # there is exactly one source for the multicast group is missing
             (src, traffic_info), = srcs.items()
 
-            # source may be in a different connected component
-            if src not in shortest_route_tree:
-                continue
-
-            queue = [src]
-
-            # add every link to the returned information in a BFS manner
-            while queue:
-                from_node = queue.pop(0)
-                for to_node, linkID in shortest_route_tree[from_node]:
-                    if to_node == disabled_node or linkID == disabled_link:
-                        continue
-                    l = overview[linkID][from_node, to_node]
-                    l['traffic'] += traffic_info['traffic']
-                    l['bandwidth'] += traffic_info['bandwidth']
-
-                    # if to_node is not destination, add it to the queue
-                    if to_node in shortest_route_tree:
-                        queue.append(to_node)
+            for linkID, from_node, to_node in walk_links(
+                    routes[mgID], 'MULTICAST', mgID, src,
+                    disabled_links, disabled_nodes):
+                l = overview[linkID][from_node, to_node]
+                l['traffic'] += traffic_info['traffic']
+                l['bandwidth'] += traffic_info['bandwidth']
 
         return routes, overview
 
-class PriorityQueue(object):
-    def __init__(self, root):
-        self.__heap = []
-        self.traversed = {root} # root is already traversed
-
-    def push(self, item):
-        _, from_node = item[:2]
-        if from_node not in self.traversed:
-            heapq.heappush(self.__heap, item)
-
-    def pop(self):
-        while len(self.__heap) > 0:
-            item = heapq.heappop(self.__heap)
-            _, from_node = item[:2]
-            if from_node not in self.traversed:
-                self.traversed.add(from_node)
-                return item
-        return None
-
 def cmp(a, b):
     # https://docs.python.org/3.0/whatsnew/3.0.html#ordering-comparisons
     return (a > b) - (a < b)
+
+def failure_set(disabled, others):
+    """Merge a disabled link/node with other ones.
+
+    Parameters
+    ----------
+    disabled : str
+        ID of disabled link/node, could be None.
+
+    others : iterable
+        IDs of other disabled links/nodes.
+
+    Returns
+    -------
+    disabled : frozenset
+        IDs of all the disabled links/nodes.
+    """
+    if disabled is None:
+        return frozenset(others)
+    return frozenset(others).union((disabled,))
+
+def walk_links(route, address_method, dst, src, disabled_links=frozenset(),
+        disabled_nodes=frozenset()):
+    """Walk along the route of a cluster of traffic.
+
+    Parameters
+    ----------
+    route : dict
+        Route of the destination, a shortest route tree of an UNICAST
+        destination, or a mapping from each node to its next hops of a
+        MULTICAST group.
+
+    address_method : str
+        UNICAST or MULTICAST.
+
+    dst : str
+        Destination device ID or Multicast Group ID.
+
+    src : str
+        Source device ID.
+
+    disabled_links : set
+        Link IDs of disabled links, traffic is dropped at them.
+
+    disabled_nodes : set
+        Node IDs of disabled nodes, traffic is dropped at them.
+
+    Yields
+    ------
+    linkID, from_node, to_node : tuple
+        Links that the traffic goes through, in the order they are walked.
+    """
+    # source may be in a different connected component
+    if src not in route:
+        return
+
+    if address_method == 'UNICAST':
+        from_node = src
+        while from_node != dst:
+            to_node, linkID = route[from_node]
+
+            if to_node in disabled_nodes or linkID in disabled_links:
+                break
+
+            yield linkID, from_node, to_node
+            from_node = to_node
+        return
+
+    queue = [src]
+
+    # add every link to the returned information in a BFS manner
+    while queue:
+        from_node = queue.pop(0)
+        for to_node, linkID in route[from_node]:
+            if to_node in disabled_nodes or linkID in disabled_links:
+                continue
+
+            yield linkID, from_node, to_node
+
+            # if to_node is not destination, add it to the queue
+            if to_node in route:
+                queue.append(to_node)
@@ -0,0 +1,108 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from array import array
+from collections import OrderedDict
+
+import logging
+logger = logging.getLogger(__name__)
+
+class CompiledGraph(object):
+    """Topology compiled to integer indexed arrays for the simulations.
+
+    Nodes and links are interned to integers, and the adjacency is stored in
+    the compressed sparse row (CSR) format: links that go toward node v are
+    stored between offsets[v] and offsets[v+1] of every link array, in the same
+    order as the adjacency of the topology index.
+
+    Integers are assigned in the order of sorted IDs, so comparing two interned
+    nodes/links gives the same result as comparing their IDs, and the
+    simulations break ties exactly as they do with IDs.
+
+    Simulations run on integers only, IDs are mapped back when their results
+    are returned.
+    """
+
+    def __init__(self, topology):
+        """Compile the topology.
+
+        Parameters
+        ----------
+        topology : TopologyIndex
+            Topology of the internal state.
+        """
+        adjacency = topology.adjacency
+
+        # ETH nodes in the order of creation, nodeID -> node type
+        self.eth_nodes = OrderedDict(topology.eth_nodes)
+        # IDs of all the switches
+        self.switches = set(topology.switches)
+
+        # index -> ID
+        self.node_ids = sorted(
+            set(adjacency).union(self.eth_nodes, self.switches))
+        self.link_ids = sorted({
+            link_info[-1]
+                for links in adjacency.values() for link_info in links
+        })
+        # ID -> index
+        self.node_index = {
+            nodeID: i for i, nodeID in enumerate(self.node_ids)
+        }
+        self.link_index = {
+            linkID: i for i, linkID in enumerate(self.link_ids)
+        }
+
+        # 1 if the node is a switch, otherwise 0
+        self.is_switch = bytearray(len(self.node_ids))
+        for nodeID in self.switches:
+            self.is_switch[self.node_index[nodeID]] = 1
+
+        # CSR arrays, each column of the adjacency of the topology index
+        # (
+        #     hop,
+        #     from, to,
+        #     speed,
+        #     from_port, from_port_bit, to_port, to_port_bit,
+        #     linkID
+        # )
+        # is stored in its own array, "to" is the row
+        self.offsets = array('l', [0])
+        self.weights = array('l')
+        self.neighbors = array('l')
+        self.speeds = array('d')
+        self.neighbor_ports = []
+        self.neighbor_port_bits = array('l')
+        self.ports = []
+        self.port_bits = array('l')
+        self.links = array('l')
+
+        for nodeID in self.node_ids:
+            for (
+                    weight,
+                    from_node, to_node,
+                    speed,
+                    from_port, from_port_bit, to_port, to_port_bit,
+                    linkID
+                ) in adjacency.get(nodeID, ()):
+                self.weights.append(weight)
+                self.neighbors.append(self.node_index[from_node])
+                self.speeds.append(speed)
+                self.neighbor_ports.append(from_port)
+                self.neighbor_port_bits.append(from_port_bit)
+                self.ports.append(to_port)
+                self.port_bits.append(to_port_bit)
+                self.links.append(self.link_index[linkID])
+            self.offsets.append(len(self.links))
+
+        # link index -> indices of its two endpoints
+        self.link_ends = array('l', [-1]) * (2 * len(self.link_ids))
+        for node in range(len(self.node_ids)):
+            for k in range(self.offsets[node], self.offsets[node+1]):
+                self.link_ends[2*self.links[k]] = self.neighbors[k]
+                self.link_ends[2*self.links[k]+1] = node
+
+        logger.info("Compiled graph of %d nodes and %d links"
+            % (len(self.node_ids), len(self.link_ids)))
+
+    def __len__(self):
+        return len(self.node_ids)
@@ -0,0 +1,109 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from array import array
+
+import logging
+logger = logging.getLogger(__name__)
+
+class LayeredTrees(object):
+    """Shortest route trees of unit weight graphs grown layer by layer.
+
+    When every link costs one hop, the cost of a node is simply its BFS depth,
+    so the trees of all the destinations are computed by BFS instead of
+    Dijkstra Algorithm, without any priority queue.
+
+    The parent of a node only depends on costs of its neighbors. Among the
+    neighbors one hop closer to the destination, Dijkstra Algorithm picks the
+    first one in the order of links:
+        - speed (higher first)
+        - inbound port (lower first)
+        - parent node (lower first)
+        - link (lower first)
+    Candidate parents of every node are sorted in that order once, so a tree
+    is identical to the one grown by Dijkstra Algorithm.
+    """
+
+    def __init__(self, graph):
+        """
+        Parameters
+        ----------
+        graph : CompiledGraph
+            Topology of the internal state compiled to integer indexed arrays.
+            All of its links should cost one hop, see applicable().
+        """
+        n = len(graph)
+        offsets = graph.offsets
+
+        # node -> nodes that it could be the parent of
+        self._successors = [
+            graph.neighbors[offsets[node]:offsets[node+1]].tolist()
+                for node in range(n)
+        ]
+
+        # node -> candidate parents and links, in the order of links
+        candidates = [[] for _ in range(n)]
+        for node in range(n):
+            for k in range(offsets[node], offsets[node+1]):
+                link = graph.links[k]
+                candidates[graph.neighbors[k]].append(
+                    ((-graph.speeds[k], graph.port_bits[k], node, link),
+                        node, link))
+        self._candidates = [
+            [(node, link) for _, node, link in sorted(c)] for c in candidates
+        ]
+
+    @staticmethod
+    def applicable(graph):
+        """Whether every link of the graph costs one hop."""
+        return all(weight == 1 for weight in graph.weights)
+
+    def grow(self, root):
+        """Grow the full shortest route tree of a destination.
+
+        Parameters
+        ----------
+        root : int
+            Index of the destination node.
+
+        Returns
+        -------
+        dist, parent, parent_link, first_child, next_sibling : tuple of arrays
+            Same as the full trees of GlobalPolicySimulation.
+        """
+        successors = self._successors
+        candidates = self._candidates
+        n = len(successors)
+
+        dist = [-1] * n
+        dist[root] = 0
+
+        # nodes in the order of their costs
+        order = []
+        frontier = [root]
+        depth = 0
+        while frontier:
+            depth += 1
+            layer = []
+            for node in frontier:
+                for successor in successors[node]:
+                    if dist[successor] == -1:
+                        dist[successor] = depth
+                        layer.append(successor)
+            order.extend(layer)
+            frontier = layer
+
+        parent = array('i', [-1]) * n
+        parent_link = array('i', [-1]) * n
+        first_child = array('i', [-1]) * n
+        next_sibling = array('i', [-1]) * n
+        for node in order:
+            cost = dist[node] - 1
+            for candidate, link in candidates[node]:
+                if dist[candidate] == cost:
+                    break
+            parent[node] = candidate
+            parent_link[node] = link
+            next_sibling[node] = first_child[candidate]
+            first_child[candidate] = node
+
+        return array('i', dist), parent, parent_link, first_child, next_sibling
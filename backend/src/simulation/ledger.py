@@ -0,0 +1,65 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+import threading
+from .global_routes import walk_links
+
+import logging
+logger = logging.getLogger(__name__)
+
+class UtilizationLedger(object):
+    """Routes and bandwidth overview of a failure scenario.
+
+    Routes only depend on the topology and which clusters of traffic exist,
+    so they stay valid when the bandwidth of a traffic is edited. Such edits
+    are recorded in the journal of the traffic aggregation, and the ledger
+    applies each of them as a delta along the known route of its cluster
+    instead of simulating the scenario again.
+    """
+    def __init__(self, routes, overview, disabled_links, disabled_nodes,
+            position):
+        """
+        Parameters
+        ----------
+        routes : dict
+            Mapping from destination to its route.
+
+        overview : dict
+            Mapping from link ID to bandwidth information of each direction.
+
+        disabled_links : set
+            Link IDs of disabled links of the scenario.
+
+        disabled_nodes : set
+            Node IDs of disabled nodes of the scenario.
+
+        position : int
+            Length of the journal when the overview is computed, entries
+            before it are already included.
+        """
+        self.routes = routes
+        self.overview = overview
+        self.disabled_links = disabled_links
+        self.disabled_nodes = disabled_nodes
+        self._position = position
+        self._lock = threading.Lock()
+
+    def sync(self, journal):
+        """Apply bandwidth changes that are not applied yet.
+
+        Parameters
+        ----------
+        journal : list
+            Journal of the traffic aggregation, a list of
+            (address_method, destination, source, delta).
+        """
+        with self._lock:
+            for address_method, dst, src, delta in journal[self._position:]:
+                for linkID, from_node, to_node in walk_links(
+                        self.routes[dst], address_method, dst, src,
+                        self.disabled_links, self.disabled_nodes):
+                    self.overview[linkID][from_node, to_node]['bandwidth'] \
+                        += delta
+            if len(journal) > self._position:
+                logger.debug("Applied %d bandwidth changes"
+                    % (len(journal) - self._position))
+                self._position = len(journal)
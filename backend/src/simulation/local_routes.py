@@ -1,9 +1,8 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
-import heapq
-from ..common import node, multicast_group
+from ..common import multicast_group
 from collections import defaultdict
-from boltons.dictutils import OrderedMultiDict
+from .bucket_queue import BucketQueue
 import pprint
 
 import logging
@@ -120,40 +119,26 @@ class LocalPolicySimulation(object):
         second link could be used for load balancing or redundancy, we should do
         that after the behavior is defined.   
     """
-    def __init__(self, adj, utraffic, mtraffic, dst_src_combination):
-        """ Initiliza the graph with adjacent matrix and total node count.
+    def __init__(self, graph, utraffic, mtraffic, dst_src_combination):
+        """ Initiliza the graph with compiled topology and clustered traffic.
 
         Parameters
         ----------
-        adj : dict
-            Adjacent matrix of a directed graph.
-            It is represented as a mapping, where the value is a list of tuples
-            that represent different links and the key is the node that all the
-            links in the list go toward.
-            The structure is like:
-            {
-                to: [
-                    (
-                        hop, 
-                        from, to, 
-                        speed, 
-                        from_port, from_port_bit, to_port, to_port_bit, 
-                        linkID
-                    )
-                ]
-            }
-            It could also be considered as:
-            {
-                from: [
-                    (
-                        hop, 
-                        to, from, 
-                        speed, 
-                        to_port, to_port_bit, from_port, from_port_bit, 
-                        linkID
-                    )
-                ]
-            }
+        graph : CompiledGraph
+            Topology of the internal state compiled to integer indexed arrays.
+            It represents a directed graph, where links that go toward node v
+            are stored between graph.offsets[v] and graph.offsets[v+1] of the
+            link arrays. Each array is a column of the adjacency:
+            (
+                hop (weights),
+                from (neighbors), to (the row itself),
+                speed (speeds),
+                from_port (neighbor_ports), from_port_bit (neighbor_port_bits),
+                to_port (ports), to_port_bit (port_bits),
+                linkID (links)
+            )
+            Since the graph is undirected, it could also be considered as links
+            that come from node v.
         utraffic : dict
             Clustered traffic dictionary for UNICAST.
             All the traffic clustered first by destination, then source.
@@ -187,14 +172,12 @@ class LocalPolicySimulation(object):
             A mapping from destination to all the sources that send traffic to
             it, including both UNICAST and MULTICAST.
         """
-        self.adj = adj
+        self.graph = graph
+        self.eth_nodes = graph.eth_nodes
         self.utraffic = utraffic
         self.mtraffic = mtraffic
         self.dst_src_combination = dst_src_combination
-        self.switches = {
-            nodeID for nodeID, n in node.items() 
-                if n['type'] == 'SWITCH'
-        }
+        self.switches = graph.switches
 
         self.gen_connected_components()
         self.shortest_route_trees = {
@@ -205,10 +188,12 @@ class LocalPolicySimulation(object):
 
     def gen_connected_components(self):
         """Generate every connected oomponents"""
+        graph = self.graph
         # Initialize every ETH node with a distinct number
-        connected_components = OrderedMultiDict(
-            (nodeID, i) for i, (nodeID, n) in enumerate(node.items())
-            if n['protocol'] == 'ETH')
+        # nodeID -> ID of its connected component
+        connected_components = {
+            nodeID: i for i, nodeID in enumerate(self.eth_nodes)
+        }
         untraversed = self.switches.copy()
 
         while untraversed:
@@ -220,15 +205,25 @@ class LocalPolicySimulation(object):
             cc_switch = {root}
             while cc_switch:
                 # current node
-                cur = cc_switch.pop()
-                for l in self.adj[cur]:
-                    _, neighbor, _, _, _, _, _, _, _ = l
+                cur = graph.node_index[cc_switch.pop()]
+                for k in range(graph.offsets[cur], graph.offsets[cur+1]):
+                    neighbor = graph.node_ids[graph.neighbors[k]]
                     connected_components[neighbor] = ccID
                     if neighbor in untraversed:
                         cc_switch.add(neighbor)
                         untraversed.remove(neighbor)
 
+        # ID of connected component -> IDs of its nodes and switches
+        component_members = defaultdict(set)
+        for nodeID, ccID in connected_components.items():
+            component_members[ccID].add(nodeID)
+
         self.connected_components = connected_components
+        self.component_members = dict(component_members)
+        self.component_switches = {
+            ccID: self.switches & cc_nodes
+                for ccID, cc_nodes in self.component_members.items()
+        }
 
     def gen_routes(self):
         """Generate shortest routes and redundant ports for all destinations.
@@ -264,20 +259,21 @@ class LocalPolicySimulation(object):
         Returns
         -------
         tree: dict
-            A map from each switch/source to a tuple of information including:
+            A map from each switch/source index to a tuple of information
+            including:
                 - number of hops to the destination
-                - ancestors
+                - interval of the node in the Euler tour of the tree
                 - other route info including outbound port, parent and link
         """
+        graph = self.graph
         ccID = self.connected_components[dst]
-        cc_nodes = set(self.connected_components.inverted().getlist(ccID))
-
-        srcs = self.dst_src_combination[dst] & cc_nodes
-        switches = self.switches & cc_nodes
+        srcs = self.dst_src_combination[dst] & self.component_members[ccID]
+        switches = self.component_switches[ccID]
 
-        untraversed = srcs | switches
+        untraversed = {graph.node_index[nodeID] for nodeID in srcs | switches}
 
-        pq = PriorityQueue(dst)
+        root = graph.node_index[dst]
+        pq = BucketQueue(root)
 
         # ------------ Note of the Algorithm ------------    
         # We will treat the graph as a directed graph, even though it is
@@ -286,13 +282,14 @@ class LocalPolicySimulation(object):
         # other direction will be disposed and will not affect the algorithm.
 
         # Initialize the priority queue
-        for (
-                weight, 
-                from_node, to_node, 
-                speed, 
-                from_port, from_port_bit, to_port, to_port_bit,
-                linkID
-            ) in self.adj[dst]:
+        begin, end = graph.offsets[root], graph.offsets[root+1]
+        for from_node, from_port, linkID, weight, speed, to_port_bit in zip(
+                graph.neighbors[begin:end],
+                graph.neighbor_ports[begin:end],
+                graph.links[begin:end],
+                graph.weights[begin:end],
+                graph.speeds[begin:end],
+                graph.port_bits[begin:end]):
 
             pq.push(
                 (
@@ -303,12 +300,13 @@ class LocalPolicySimulation(object):
                     (weight, -speed, to_port_bit), 
                     # source endpoint
                     from_node,
-                    # weight, ancestors, outbound port, destination node, linkID
-                    (weight, set(), (from_port, to_node, linkID)),
+                    # weight, outbound port, destination node, linkID
+                    (weight, (from_port, root, linkID)),
                 )
             )
 
         tree = {}
+        children = defaultdict(list)
         while untraversed:
             l = pq.pop()
             if l is None:
@@ -316,24 +314,23 @@ class LocalPolicySimulation(object):
                 # terminates
                 raise Exception
             (cost, _, _), from_node, info = l
-            _, ancestors, _ = info
+            _, (_, to_node, _) = info
             tree[from_node] = info
+            children[to_node].append(from_node)
     
             untraversed.discard(from_node)
 
             # now the source becomes the new destination
             # add all links that go to the source to the priority queue
             new_dst = from_node
-
-            # create a copy, then add the parent to ancestors
-            ancestors = ancestors | {new_dst}
-            for (
-                weight, 
-                from_node, to_node, 
-                speed, 
-                from_port, from_port_bit, to_port, to_port_bit,
-                linkID
-            ) in self.adj[new_dst]:
+            begin, end = graph.offsets[new_dst], graph.offsets[new_dst+1]
+            for from_node, from_port, linkID, weight, speed, to_port_bit in zip(
+                    graph.neighbors[begin:end],
+                    graph.neighbor_ports[begin:end],
+                    graph.links[begin:end],
+                    graph.weights[begin:end],
+                    graph.speeds[begin:end],
+                    graph.port_bits[begin:end]):
                 pq.push(
                     (
                         # order of links: 
@@ -343,12 +340,55 @@ class LocalPolicySimulation(object):
                         (cost+weight, -speed, to_port_bit), 
                         # source endpoint
                         from_node,
-                        # weight, ancestors, route information
-                        (cost+weight, ancestors, (from_port, to_node, linkID)),
+                        # weight, route information
+                        (cost+weight, (from_port, new_dst, linkID)),
                     )
                 )
 
-        return tree
+        intervals = self._euler_tour(root, children)
+        return {
+            from_node: (cost, intervals[from_node], route)
+                for from_node, (cost, route) in tree.items()
+        }
+
+    @staticmethod
+    def _euler_tour(root, children):
+        """Number nodes of a tree in DFS order.
+
+        A node A is an ancestor of node B if and only if the interval of B is
+        inside the interval of A, so ancestors are checked in constant time
+        instead of being copied into every node.
+
+        Parameters
+        ----------
+        root: int
+            Index of the root of the tree.
+
+        children: dict
+            Mapping from each node index to indices of its children.
+
+        Returns
+        -------
+        intervals: dict
+            Mapping from each node index to a tuple of the first and the last
+            number of its subtree.
+        """
+        intervals = {}
+        first = {}
+        counter = 0
+        # negative (bitwise inverted) nodes mark the end of their subtrees
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node >= 0:
+                first[node] = counter
+                counter += 1
+                stack.append(~node)
+                stack.extend(children.get(node, ()))
+            else:
+                node = ~node
+                intervals[node] = (first.pop(node), counter - 1)
+        return intervals
 
     def get_unicast_local_routes(self, dst):
         """Generate primary and backup (if exists) ports for every switches.
@@ -367,39 +407,36 @@ class LocalPolicySimulation(object):
                 - next hop node
                 - linkID
         """
+        graph = self.graph
         shortest_route_tree = self.shortest_route_trees[dst]
 
         ccID = self.connected_components[dst]
-        cc_nodes = set(self.connected_components.inverted().getlist(ccID))
+        srcs = self.dst_src_combination[dst] & self.component_members[ccID]
+        switches = self.component_switches[ccID]
 
-        srcs = self.dst_src_combination[dst] & cc_nodes
-        switches = self.switches & cc_nodes
+        root = graph.node_index[dst]
 
         tree = {}
         for src in srcs:
-            _, _, primary = shortest_route_tree[src]
+            _, _, primary = shortest_route_tree[graph.node_index[src]]
             backup = ()
-            tree[src] = (primary, backup)
+            tree[src] = (self._route_info(primary), backup)
         
         for sw in switches:
-            _, _, primary = shortest_route_tree[sw]
+            node = graph.node_index[sw]
+            _, (first, last), primary = shortest_route_tree[node]
             _, parent, _ = primary
 
             # get backup port if it exists
             candidates = []
-            for (
-                weight, 
-                neighbor, _, 
-                speed, 
-                _, _, from_port, from_port_bit, 
-                linkID
-            ) in self.adj[sw]:
+            for k in range(graph.offsets[node], graph.offsets[node+1]):
+                neighbor = graph.neighbors[k]
 
                 # non switches are not considered
-                if node[neighbor]['type'] != 'SWITCH':
+                if not graph.is_switch[neighbor]:
                     continue
 
-                cost, ancestors, _ = shortest_route_tree[neighbor]
+                cost, (neighbor_first, _), _ = shortest_route_tree[neighbor]
 
                 # first, it there is a valid backup port, set is as a candidate
                 # a candidate should satisfy the following
@@ -407,15 +444,19 @@ class LocalPolicySimulation(object):
                     # parent node is not considered
                     neighbor != parent and
                     #   descendant nodes is not considered
-                    sw not in ancestors
+                    not first < neighbor_first <= last
                 ):
                     candidates.append((
                         # order of candidate ports: 
                         #   weight (lower first)
                         #   speed (higher first)
                         #   outbound port (lower first)
-                        (weight+cost, -speed, from_port_bit),
-                        (from_port, neighbor, linkID)
+                        (
+                            graph.weights[k]+cost,
+                            -graph.speeds[k],
+                            graph.port_bits[k]
+                        ),
+                        (graph.ports[k], neighbor, graph.links[k])
                     ))
 
             # if there is at least one candidate, the shortest one is chosen
@@ -425,44 +466,27 @@ class LocalPolicySimulation(object):
             # no valid backup port exist, then there could be two reasons
             # if the parent of the switch is the destination, and no redundant
             # path to that destination, then we don't need a backup port
-            elif parent == dst:
+            elif parent == root:
                 backup = ()
 
             # otherwise, we just forward the packet to a child of the node
             # in most scenarios it may be the optimal, but in some cases it is
             # not, anyway, we don't assure anything
             else:
-                for (
-                    _, 
-                    neighbor, _, 
-                    _, 
-                    _, _, from_port, _, 
-                    linkID
-                ) in self.adj[sw]:
+                for k in range(graph.offsets[node], graph.offsets[node+1]):
+                    neighbor = graph.neighbors[k]
                     _, _, (_, parent, _) = shortest_route_tree[neighbor]
-                    if parent == sw:
-                        backup = (from_port, neighbor, linkID)
+                    if parent == node:
+                        backup = (graph.ports[k], neighbor, graph.links[k])
                         break
 
-            tree[sw] = (primary, backup)
+            tree[sw] = (self._route_info(primary), self._route_info(backup))
 
         return tree
 
-class PriorityQueue(object):
-    def __init__(self, root):
-        self.__heap = []
-        self.traversed = {root} # root is already traversed
-
-    def push(self, item):
-        _, from_node = item[:2]
-        if from_node not in self.traversed:
-            heapq.heappush(self.__heap, item)
-
-    def pop(self):
-        while len(self.__heap) > 0:
-            item = heapq.heappop(self.__heap)
-            _, from_node = item[:2]
-            if from_node not in self.traversed:
-                self.traversed.add(from_node)
-                return item
-        return None
\ No newline at end of file
+    def _route_info(self, info):
+        """Map route information of interned nodes/links back to IDs."""
+        if not info:
+            return info
+        port, to_node, linkID = info
+        return (port, self.graph.node_ids[to_node], self.graph.link_ids[linkID])
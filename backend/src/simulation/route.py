@@ -1,10 +1,14 @@
 # Author: yf-yang <directoryyf@gmail.com>
 
-from ..common import link, node, traffic, multicast_group
+from ..common import (
+    sm, link, node, traffic, topology, aggregation)
 import itertools
-from collections import defaultdict
-from .global_routes import GlobalPolicySimulation
+from .global_routes import GlobalPolicySimulation, failure_set
 from .local_routes import LocalPolicySimulation
+from .graph import CompiledGraph
+from .cache import route_cache
+from .sweep import BandwidthTable
+from .ledger import UtilizationLedger
 import pprint
 
 import logging
@@ -12,283 +16,254 @@ logger = logging.getLogger(__name__)
 
 __METHOD__ = ('UNICAST', 'MULTICAST')
 
-def gen_routes(disabled_link=None, disabled_node=None):
-    """Generate routes for all the destinations"""
+def routing_generation():
+    """Generation of everything that routes depend on.
 
-    ### organize information
-    # view the topology as a directed graph
-    # represented by adjacency matrix
-    # {
-    #     to: [
-    #         (
-    #             hop, 
-    #             from, to, 
-    #             speed, 
-    #             from_port, from_port_bit, to_port, to_port_bit, 
-    #             linkID
-    #         )
-    #     ]
-    # }
-    adjacency = defaultdict(list)
-    # traffic is grouped by address methods (UNICAST/MULTICAST)
-    # {
-    #     destination: {
-    #         source: {
-    #             {
-    #                 "traffic": [
-    #                     {
-    #                         "ID": trafficID,
-    #                         "bandwidth": bandwidth,
-    #                     }
-    #                 ],
-    #                 "bandwidth": total bandwidth,
-    #             }
-    #         }
-    #     }
-    # }
-    utraffic = defaultdict(
-        lambda: defaultdict(
-            lambda: {'traffic': [], 'bandwidth': 0.0}))
-    mtraffic = defaultdict(
-        lambda: defaultdict(
-            lambda: {'traffic': [], 'bandwidth': 0.0}))
-
-    for linkID, l in link.items():
-        (x, x_port), (y, y_port) = l['endpoints']
-        # device port bit is undefined, assume they are all -1 for now
-        x_port_bit = node[x]['ports'][x_port].get('port_bit', -1)
-        y_port_bit = node[y]['ports'][y_port].get('port_bit', -1)
-        speed = l['available_bandwidth']
-        
-        adjacency[y].append(
-            (
-                1, 
-                x, y, 
-                speed, 
-                x_port, x_port_bit, y_port, y_port_bit, 
-                linkID
-            )
-        )
-        adjacency[x].append(
-            (
-                1, 
-                y, x, 
-                speed, 
-                y_port, y_port_bit, x_port, x_port_bit, 
-                linkID
-            )
-        )
+    It is the generation of the internal state, which is not bumped by an
+    update that only changes the bandwidth of a traffic, so simulations
+    survive it.
+    """
+    return sm.generation
 
+def compile_graph():
+    """Compile the topology of the current state for the simulations."""
+    return route_cache.get(
+        routing_generation(), ('graph',), lambda: CompiledGraph(topology))
 
-    for trafficID, t in traffic.items():
-        address_method = t['destination']['address_method']
-        if address_method == 'UNICAST':
-            src = t['source']['device']
-            dst = t['destination']['device']
-            utraffic[dst][src]['traffic'].append(
-                {
-                    'ID': trafficID, 
-                    'bandwidth':t['bandwidth']
-                })
-            utraffic[dst][src]['bandwidth'] += t['bandwidth']
-        elif address_method == 'MULTICAST':
-            src = t['source']['device']
-            mg = t['destination']['multicast_group']
-            mtraffic[mg][src]['traffic'].append(
-                {
-                    'ID': trafficID, 
-                    'bandwidth':t['bandwidth']
-                })
-            mtraffic[mg][src]['bandwidth'] += t['bandwidth']
-
-    # A mapping from destination to all possible sources
-    dst_src_combination = defaultdict(set)
-    dst_src_combination.update({
-        dst: set(srcs) for dst, srcs in utraffic.items()
-    })
-    # add mulitcast sources into the mapping
-    for mg, srcs in mtraffic.items():
-        for dst in multicast_group[mg]['devices']:
-            for src in srcs:
-                dst_src_combination[dst].add(src)
-
-    global_graph = GlobalPolicySimulation(
-        adjacency, 
-        utraffic, 
-        mtraffic, 
-        dst_src_combination
-    )
+def build_global_simulation(clusters=None):
+    """Build the global policy simulation of the current state.
 
+    The simulation is independent of failure scenarios, so it could be reused
+    to solve any number of them.
 
-    routes, overview = global_graph.get_overview(
-        disabled_link=disabled_link, disabled_node=disabled_node)
-    return routes, overview
+    Parameters
+    ----------
+    clusters : Clusters
+        Snapshot of the traffic clusters, see TrafficAggregation.snapshot().
+        A snapshot of the current state is taken if it is None.
 
-def gen_local_routes():
-    """Generate routes for all the destinations"""
+    Returns
+    -------
+    clusters : Clusters
+        Snapshot of the traffic clusters that the simulation works on.
 
-    ### organize information
-    # view the topology as a directed graph
-    # represented by adjacency matrix
-    # {
-    #     to: [
-    #         (
-    #             hop, 
-    #             from, to, 
-    #             speed, 
-    #             from_port, from_port_bit, to_port, to_port_bit, 
-    #             linkID
-    #         )
-    #     ]
-    # }
-    adjacency = defaultdict(list)
-    # traffic is grouped by address methods (UNICAST/MULTICAST)
-    # {
-    #     destination: {
-    #         source: {
-    #             {
-    #                 "traffic": [
-    #                     {
-    #                         "ID": trafficID,
-    #                         "bandwidth": bandwidth,
-    #                     }
-    #                 ],
-    #                 "bandwidth": total bandwidth,
-    #             }
-    #         }
-    #     }
-    # }
-    utraffic = defaultdict(
-        lambda: defaultdict(
-            lambda: {'traffic': [], 'bandwidth': 0.0}))
-    mtraffic = defaultdict(
-        lambda: defaultdict(
-            lambda: {'traffic': [], 'bandwidth': 0.0}))
-
-    for linkID, l in link.items():
-        (x, x_port), (y, y_port) = l['endpoints']
-        # device port bit is undefined, assume they are all -1 for now
-        x_port_bit = node[x]['ports'][x_port].get('port_bit', -1)
-        y_port_bit = node[y]['ports'][y_port].get('port_bit', -1)
-        speed = l['available_bandwidth']
-        
-        adjacency[y].append(
-            (
-                1, 
-                x, y, 
-                speed, 
-                x_port, x_port_bit, y_port, y_port_bit, 
-                linkID
-            )
-        )
-        adjacency[x].append(
-            (
-                1, 
-                y, x, 
-                speed, 
-                y_port, y_port_bit, x_port, x_port_bit, 
-                linkID
-            )
-        )
+    simulation : GlobalPolicySimulation
+        The simulation.
+    """
+    if clusters is None:
+        clusters = aggregation.snapshot()
+
+    return clusters, GlobalPolicySimulation(
+        compile_graph(), 
+        clusters.utraffic, 
+        clusters.mtraffic, 
+        clusters.dst_src_combination,
+        groups=clusters.groups
+    )
 
+class RouteContext(object):
+    """Route computation context of a single request.
 
-    for trafficID, t in traffic.items():
-        address_method = t['destination']['address_method']
-        if address_method == 'UNICAST':
-            src = t['source']['device']
-            dst = t['destination']['device']
-            utraffic[dst][src]['traffic'].append(
-                {
-                    'ID': trafficID, 
-                    'bandwidth':t['bandwidth']
-                })
-            utraffic[dst][src]['bandwidth'] += t['bandwidth']
-        elif address_method == 'MULTICAST':
-            src = t['source']['device']
-            mg = t['destination']['multicast_group']
-            mtraffic[mg][src]['traffic'].append(
-                {
-                    'ID': trafficID, 
-                    'bandwidth':t['bandwidth']
-                })
-            mtraffic[mg][src]['bandwidth'] += t['bandwidth']
-
-    # A mapping from destination to all possible sources
-    dst_src_combination = defaultdict(set)
-    dst_src_combination.update({
-        dst: set(srcs) for dst, srcs in utraffic.items()
-    })
-    # add mulitcast sources into the mapping
-    for mg, srcs in mtraffic.items():
-        for dst in multicast_group[mg]['devices']:
-            for src in srcs:
-                dst_src_combination[dst].add(src)
+    The global policy simulation is built once, then each distinct failure
+    scenario is solved at most once and shared by all the queries of the 
+    request. Solutions are also kept in the route cache, so requests that 
+    arrive before the next WRITE operation that changes routes are able to
+    reuse them. Bandwidth edits in between are applied to the solutions as
+    deltas.
+    """
+    def __init__(self, cache=route_cache):
+        self._cache = cache
+        self._generation = routing_generation()
+        # (disabled_links, disabled_nodes) -> UtilizationLedger
+        self._scenarios = {}
+
+    def _simulation(self):
+        return self._cache.get(
+            self._generation, ('global',), build_global_simulation)
+
+    @property
+    def clusters(self):
+        return self._simulation()[0]
+
+    @property
+    def graph(self):
+        return self._simulation()[1]
+
+    def check(self, disabled_links, disabled_nodes):
+        """Check that failed links/nodes exist in the simulation.
+
+        Parameters
+        ----------
+        disabled_links : iterable
+            Link IDs of disabled links.
+
+        disabled_nodes : iterable
+            Node IDs of disabled nodes.
+
+        Raises
+        ------
+        Exception
+            If any of them is unknown.
+        """
+        graph = self.graph.graph
+        for kind, IDs, index in (
+                ('link', disabled_links, graph.link_index),
+                ('node', disabled_nodes, graph.node_index)):
+            unknown = sorted(ID for ID in IDs if ID not in index)
+            if unknown:
+                raise Exception("Unknown failed %s %s"
+                    % (kind, ', '.join(unknown)))
+
+    def solve(self, disabled_link=None, disabled_node=None,
+            disabled_links=(), disabled_nodes=()):
+        """Get routes and bandwidth overview of a failure scenario.
+
+        Parameters
+        ----------
+        disabled_link : str
+            Link ID of disabled link.
+
+        disabled_node : str
+            Node ID of disabled node.
+
+        disabled_links : iterable
+            Link IDs of other disabled links.
+
+        disabled_nodes : iterable
+            Node IDs of other disabled nodes.
+
+        Returns
+        -------
+        routes : dict
+            Mapping from destination to its shortest route tree.
+
+        overview : dict
+            Mapping from link ID to bandwidth information of each direction.
+        """
+        scenario = (
+            failure_set(disabled_link, disabled_links),
+            failure_set(disabled_node, disabled_nodes)
+        )
+        if scenario not in self._scenarios:
+            self._scenarios[scenario] = self._cache.get(
+                self._generation, ('overview',) + scenario,
+                lambda: self._solve(*scenario))
+        ledger = self._scenarios[scenario]
+        ledger.sync(self.clusters.journal)
+        return ledger.routes, ledger.overview
+
+    def bandwidth_table(self, build=False, workers=None):
+        """Get the bandwidth table of all single failure scenarios.
+
+        Parameters
+        ----------
+        build : bool
+            Whether or not to solve all the scenarios if the table is missing.
+
+        workers : int
+            Number of worker processes that solve the scenarios.
+
+        Returns
+        -------
+        table : BandwidthTable or None
+            The table, None if it is missing and not built.
+        """
+        # the table is stored along with the length of the journal when it is
+        # solved, it is dropped once the bandwidth of some traffic changes
+        solution = self._cache.peek(self._generation, ('sweep',))
+        if solution is not None and \
+                solution[0] != len(self.clusters.journal):
+            self._cache.discard(self._generation, ('sweep',))
+            solution = None
+
+        if solution is None and build:
+            solution = self._cache.get(self._generation, ('sweep',),
+                lambda: self._sweep(workers))
+        return solution[1] if solution is not None else None
+
+    def _sweep(self, workers):
+        clusters, graph = self._simulation()
+        if clusters.position != len(clusters.journal):
+            # the table could not apply the journal, so it is solved from
+            # clusters with the current bandwidth
+            latest = aggregation.snapshot()
+            if latest.version == clusters.version:
+                clusters, graph = build_global_simulation(latest)
+        return clusters.position, BandwidthTable(
+            graph, topology.eth_nodes, workers=workers)
+
+    def _solve(self, disabled_links, disabled_nodes):
+        logger.info("Solving routes with disabled links %s and disabled nodes "
+            "%s" % (sorted(disabled_links), sorted(disabled_nodes)))
+        clusters, graph = self._simulation()
+        routes, overview = graph.get_overview(
+            disabled_links=disabled_links, disabled_nodes=disabled_nodes)
+        return UtilizationLedger(
+            routes, overview, disabled_links, disabled_nodes, clusters.position)
+
+def gen_routes(disabled_link=None, disabled_node=None,
+        disabled_links=(), disabled_nodes=()):
+    """Generate routes for all the destinations"""
+    return RouteContext().solve(
+        disabled_link, disabled_node, disabled_links, disabled_nodes)
+
+def gen_local_routes():
+    """Generate routes for all the destinations"""
+    return route_cache.get(
+        routing_generation(), ('local',), _gen_local_routes)
 
+def _gen_local_routes():
+    clusters = aggregation.snapshot()
     local_graph = LocalPolicySimulation(
-        adjacency, 
-        utraffic, 
-        mtraffic, 
-        dst_src_combination
+        compile_graph(), 
+        clusters.utraffic, 
+        clusters.mtraffic, 
+        clusters.dst_src_combination
     )
 
-
     routes = local_graph.gen_routes()
     return routes
 
 def filter_traffic(src, dst, trafficID, method):
-    dst_key = 'device' if method == 'UNICAST' else 'multicast_group'
-    src_key = 'device'
-
-    database = traffic
-    if method is not None:
-        database = {
-            k: v for k, v in database.items()
-                if v['destination']['address_method'] == method
-        }
-
-    if trafficID is not None:
-        if trafficID not in database:
-            return []
-        database = {trafficID: database[trafficID]}
-
-    if src is not None:
-        database = {
-            k: v for k, v in database.items()
-                if v['source'][src_key] == src
-        }
-
-    if dst is not None:
-        database = {
-            k: v for k, v in database.items()
-                if v['destination'][dst_key] == dst
-        }
-    
-    trafficID = []
-    for k, v in database.items():
-        trafficID.append(
-            (
-                v['source'][src_key], # src
-                v['destination'][dst_key], # dst
-                k, # trafficID
-                method, # method
-            ))
-    return trafficID
-
-def query_factory(src, dst, trafficID, flink, fnode, method):
-    """Fill None argument and wrap arguments in an iterable"""
+    """Find traffic that satisfy all the given conditions by indexes.
+
+    Returns
+    -------
+    traffic : list
+        Tuples of (src, dst, trafficID, method) in the order of creation.
+    """
+    found = traffic.lookup(
+        src=src, dst=dst, method=method, trafficID=trafficID)
+    return [
+        (
+            src, # src
+            dst, # dst
+            k, # trafficID
+            method, # method
+        ) for k, _, src, dst in found
+    ]
+
+def query_factory(src, dst, trafficID, flink, fnode, method,
+        flinks=None, fnodes=None, context=None):
+    """Fill None argument and wrap arguments in an iterable
+
+    Failed links/nodes are also checked if the route context is given.
+    """
     # method must be present
     if method not in __METHOD__:
         raise Exception("Argument <method> should be one of %s, but got %s"
             % (', '.join(__METHOD__), method))
 
-    # flink & fnode combinations, supported commbinations are
+    # flink(s) & fnode(s) combinations, any combination is supported
     # flink - Situation when a link is down
     # fnode - Situation when a node is down
+    # flinks/fnodes - Situation when several links/nodes are down together,
+    #   e.g. links in the same cable tray, or a switch and its uplinks
     # Neither - Situation when neither of them is down, i.e. primary path
-    if flink is not None and fnode is not None:
-        raise Exception("flink and fnode should not be offered simultaneously")
-    flink = [flink]
-    fnode = [fnode]
+    flink = [failure_set(flink, flinks or ())]
+    fnode = [failure_set(fnode, fnodes or ())]
+    if context is not None:
+        context.check(flink[0], fnode[0])
 
     ### src & dst & traffic combinations, supported combinations are:
     # src - All the paths of traffic that originate from src
@@ -305,7 +280,9 @@ def query_routes(
     trafficID=None,
     flink=None,
     fnode=None,
-    method=None):
+    method=None,
+    flinks=None,
+    fnodes=None):
     """Query route(s) on given situation
     
     Parameters
@@ -323,77 +300,220 @@ def query_routes(
     method : str
         Address method to determine destination type. Supported values are
         UNICAST and MULTICAST.
+    flinks : iterable
+        IDs of other failed links.
+    fnodes : iterable
+        IDs of other failed nodes.
+    """
+    return list(iter_routes(
+        src, dst, trafficID, flink, fnode, method, flinks, fnodes))
+
+def iter_routes(
+    src=None,
+    dst=None,
+    trafficID=None,
+    flink=None,
+    fnode=None,
+    method=None,
+    flinks=None,
+    fnodes=None):
+    """Query route(s) on given situation lazily.
+
+    Arguments, including failed links/nodes, are validated and traffic are
+    filtered immediately, so errors are raised before anything is returned,
+    but each route is only walked when it is iterated. Parameters are the
+    same as query_routes().
+
+    Returns
+    -------
+    routes : generator
+        Route of each traffic, in the same format as query_routes().
     """
     # Replace None values and wrap all values in an iterable
+    context = RouteContext()
+    querys = query_factory(
+        src, dst, trafficID, flink, fnode, method, flinks, fnodes, context)
+    return _walk_querys(querys, context)
 
-    querys = query_factory(src, dst, trafficID, flink, fnode, method)
-    results = []
+def _walk_querys(querys, context):
     for q in querys:
-        flink, fnode, (src, dst, trafficID, method) = q
-        routes, info = gen_routes(flink, fnode)
+        flinks, fnodes, (src, dst, trafficID, method) = q
+        routes, info = context.solve(
+            disabled_links=flinks, disabled_nodes=fnodes)
+
+        result = route_result(
+            routes, flinks, fnodes, src, dst, trafficID, method)
+
+        # source may be in a different connected component
+        if result is None:
+            continue
 
-        links = []
+        yield result
 
-        shortest_route_tree = routes[dst]
+def query_routes_batch(specs):
+    """Query route(s) of many situations at once.
 
-        if method == 'UNICAST':
+    Queries are grouped by their failure scenarios, so each scenario is solved
+    once and walked for all the queries that share it.
+
+    Parameters
+    ----------
+    specs : list
+        Each spec is a dict of arguments of query_routes(), missing ones are
+        None.
+
+    Returns
+    -------
+    results : list
+        Routes of each spec, in the same order as specs. Routes of a spec are
+        in the same format as query_routes().
+    """
+    context = RouteContext()
+    # (flinks, fnodes) -> [(index of the spec, query)]
+    scenarios = {}
+    for i, spec in enumerate(specs):
+        querys = query_factory(
+            spec.get('src'),
+            spec.get('dst'),
+            spec.get('trafficID'),
+            spec.get('flink'),
+            spec.get('fnode'),
+            spec.get('method'),
+            spec.get('flinks'),
+            spec.get('fnodes'),
+            context)
+        for flinks, fnodes, q in querys:
+            scenarios.setdefault((flinks, fnodes), []).append((i, q))
+
+    results = [[] for _ in specs]
+    for (flinks, fnodes), querys in scenarios.items():
+        routes, info = context.solve(
+            disabled_links=flinks, disabled_nodes=fnodes)
+        for i, (src, dst, trafficID, method) in querys:
+            result = route_result(
+                routes, flinks, fnodes, src, dst, trafficID, method)
             # source may be in a different connected component
-            if src not in shortest_route_tree:
-                continue
-
-            from_node = src
-            while from_node != dst:
-                to_node, linkID = shortest_route_tree[from_node]
-                if from_node == fnode or linkID == flink:
-                    break
+            if result is not None:
+                results[i].append(result)
+    logger.info("Solved %d route specs with %d failure scenarios"
+        % (len(specs), len(scenarios)))
+    return results
+
+def route_result(routes, flinks, fnodes, src, dst, trafficID, method):
+    """Route of a traffic in a solved scenario, None if it is unreachable."""
+    links = walk_route(routes[dst], src, dst, method, flinks, fnodes)
+    if links is None:
+        return None
+    return dict(
+        src = src,
+        dst = dst,
+        traffic = trafficID,
+        method = method,
+        links = links
+        )
+
+def walk_route(shortest_route_tree, src, dst, method, flinks=(), fnodes=()):
+    """Walk along the shortest route tree from the source.
+
+    Parameters
+    ----------
+    shortest_route_tree : dict
+        Shortest route tree of the destination.
+    src : str
+        Source device ID.
+    dst : str
+        Destination device ID or Multicast Group ID.
+    method : str
+        Address method of the destination.
+    flinks : set
+        IDs of the failed links.
+    fnodes : set
+        IDs of the failed nodes.
+
+    Returns
+    -------
+    links : list or None
+        Links that the traffic goes through, None if the source is not in the
+        tree.
+    """
+    # source may be in a different connected component
+    if src not in shortest_route_tree:
+        return None
+
+    links = []
+    if method == 'UNICAST':
+        from_node = src
+        while from_node != dst:
+            to_node, linkID = shortest_route_tree[from_node]
+            if from_node in fnodes or linkID in flinks:
+                break
+            links.append(
+                {
+                    'from': from_node,
+                    'to': to_node,
+                    'link': linkID
+                })
+            from_node = to_node
+    elif method == 'MULTICAST':
+        queue = [src]
+
+        # add every link to the returned information in a BFS manner
+        while queue:
+            from_node = queue.pop(0)
+            for to_node, linkID in shortest_route_tree[from_node]:
+                if to_node in fnodes or linkID in flinks:
+                    continue
+                
                 links.append(
-                    {
-                        'from': from_node,
-                        'to': to_node,
-                        'link': linkID
-                    })
-                from_node = to_node
-        elif method == 'MULTICAST':
-            queue = [src]
+                {
+                    'from': from_node,
+                    'to': to_node,
+                    'link': linkID
+                })
 
-            # source may be in a different connected component
-            if src not in shortest_route_tree:
-                continue
-
-            # add every link to the returned information in a BFS manner
-            while queue:
-                from_node = queue.pop(0)
-                for to_node, linkID in shortest_route_tree[from_node]:
-                    if to_node == fnode or linkID == flink:
-                        continue
-                    
-                    links.append(
-                    {
-                        'from': from_node,
-                        'to': to_node,
-                        'link': linkID
-                    })
-
-                    # if to_node is not destination, add it to the queue
-                    if to_node in shortest_route_tree:
-                        queue.append(to_node)
-
-        results.append(
-            dict(
-                src = src,
-                dst = dst,
-                traffic = trafficID,
-                method = method,
-                links = links
-                ))
-    return results 
-
-def query_bws(flink=None, fnode=None):
-    if flink is not None and flink not in link:
+                # if to_node is not destination, add it to the queue
+                if to_node in shortest_route_tree:
+                    queue.append(to_node)
+    return links
+
+def query_bws(flink=None, fnode=None, sweep=False, workers=None,
+        flinks=None, fnodes=None):
+    """Query bandwidth of every link on given situation
+
+    Parameters
+    ----------
+    flink : str
+        ID of the failed link.
+    fnode : str
+        ID of the failed node.
+    sweep : bool
+        Whether or not to solve every single failure scenario in one pass.
+        Once solved, failure queries are looked up until the next WRITE 
+        operation.
+    workers : int
+        Number of worker processes that solve the scenarios of a sweep.
+    flinks : iterable
+        IDs of other failed links.
+    fnodes : iterable
+        IDs of other failed nodes.
+    """
+    flinks = failure_set(flink, flinks or ())
+    fnodes = failure_set(fnode, fnodes or ())
+    if any(linkID not in link for linkID in flinks):
         raise Exception
-    if fnode is not None and fnode not in node:
+    if any(nodeID not in node for nodeID in fnodes):
         raise Exception
-    routes, info = gen_routes(flink, fnode)
+
+    context = RouteContext()
+    table = context.bandwidth_table(build=sweep, workers=workers)
+    # the table only has single failure scenarios
+    if len(flinks) + len(fnodes) <= 1:
+        flink, = flinks or (None,)
+        fnode, = fnodes or (None,)
+        if table is not None and (flink, fnode) in table:
+            return table.lookup(flink, fnode)
+
+    routes, info = context.solve(disabled_links=flinks, disabled_nodes=fnodes)
 
     bwresult = {
         linkID: [
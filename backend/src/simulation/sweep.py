@@ -0,0 +1,152 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from concurrent.futures import ProcessPoolExecutor
+import pickle
+
+import logging
+logger = logging.getLogger(__name__)
+
+# simulation of a worker process, set once by the pool initializer
+_worker_graph = None
+
+def _init_worker(state):
+    global _worker_graph
+    _worker_graph = pickle.loads(state)
+
+def _solve_scenario(scenario):
+    _, overview = _worker_graph.get_overview(
+        disabled_link=scenario[0], disabled_node=scenario[1])
+    return scenario, BandwidthTable._compact(overview)
+
+class BandwidthTable(object):
+    """Bandwidth overview of the primary state and every single failure.
+
+    All the scenarios are solved in one pass, so later failure queries are
+    simply lookups. Type II links/nodes are still walked (traffic is dropped
+    at the failed entity), but their routes are never recomputed since the
+    simulation returns primary routes for them.
+
+    Each row of the table is a mapping from link ID to a tuple of
+    (from, to, bandwidth, traffic) for both directions. Entries that are equal
+    to the primary ones are shared with the primary row instead of being
+    stored again, since a single failure usually affects few links.
+
+    Scenarios are independent of each other, so they could be spread across a
+    pool of worker processes.
+    """
+    def __init__(self, graph, nodes, workers=None):
+        """Solve all the scenarios.
+
+        Parameters
+        ----------
+        graph : GlobalPolicySimulation
+            Global policy simulation of the current state.
+
+        nodes : iterable
+            IDs of all the nodes, other entities of the simulation are links.
+
+        workers : int
+            Number of worker processes, at most one per scenario. Scenarios
+            are solved in the current process if it is None or not greater
+            than 1.
+        """
+        nodes = set(nodes)
+        _, overview = graph.get_overview()
+        self.primary = self._compact(overview)
+        self._rows = {(None, None): self.primary}
+
+        scenarios = [
+            (None, entity) if entity in nodes else (entity, None)
+                for entity in graph.entity_type.keys()
+        ]
+
+        if workers is not None:
+            workers = min(workers, len(scenarios))
+        if workers is not None and workers > 1:
+            solutions = self._solve_parallel(graph, scenarios, workers)
+        else:
+            solutions = (
+                (scenario, self._compact(graph.get_overview(
+                    disabled_link=scenario[0],
+                    disabled_node=scenario[1])[1]))
+                    for scenario in scenarios
+            )
+
+        for scenario, row in solutions:
+            self._rows[scenario] = self._share(row, self.primary)
+
+        logger.info("Solved bandwidth of %d failure scenarios"
+            % (len(self._rows) - 1))
+
+    def __contains__(self, scenario):
+        return scenario in self._rows
+
+    def lookup(self, disabled_link=None, disabled_node=None):
+        """Bandwidth overview of a scenario.
+
+        Parameters
+        ----------
+        disabled_link : str
+            Link ID of disabled link.
+
+        disabled_node : str
+            Node ID of disabled node.
+
+        Returns
+        -------
+        bandwidth : dict
+            Mapping from link ID to bandwidth information of each direction.
+        """
+        row = self._rows[disabled_link, disabled_node]
+        return {
+            linkID: [
+                {
+                    'from': from_node,
+                    'to': to_node,
+                    'traffic': list(traffic),
+                    'bandwidth': bandwidth
+                }
+                for from_node, to_node, bandwidth, traffic in entries
+            ] for linkID, entries in row.items()
+        }
+
+    @staticmethod
+    def _solve_parallel(graph, scenarios, workers):
+        """Solve scenarios across a pool of worker processes.
+
+        The graph is pickled and sent to each worker only once by the pool
+        initializer, tasks simply carry the scenarios. It is pickled
+        explicitly, so forked workers never inherit scratch state of a
+        scenario that another thread is solving.
+        """
+        logger.info("Solving %d failure scenarios with %d workers"
+            % (len(scenarios), workers))
+        # large chunks keep the overhead of inter-process communication low
+        chunksize = max(1, len(scenarios) // (workers * 4))
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(pickle.dumps(graph),)) as executor:
+            return list(executor.map(
+                _solve_scenario, scenarios, chunksize=chunksize))
+
+    @staticmethod
+    def _compact(overview):
+        return {
+            linkID: tuple(
+                (
+                    from_node, to_node,
+                    direction_info['bandwidth'],
+                    tuple(direction_info['traffic'])
+                )
+                for (from_node, to_node), direction_info in link_info.items()
+            ) for linkID, link_info in overview.items()
+        }
+
+    @staticmethod
+    def _share(row, primary):
+        """Replace entries that are equal to the primary ones by them."""
+        for linkID, entries in row.items():
+            if primary.get(linkID) == entries:
+                row[linkID] = primary[linkID]
+        return row
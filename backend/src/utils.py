@@ -50,4 +50,10 @@ class JSONEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, (data.StateManager, data.BaseDataManager)):
             return obj.as_dict()
+        if isinstance(obj, data.utils.Record):
+            return obj.to_dict()
+        if isinstance(obj, data.utils.ReadOnlyDict):
+            return dict(obj)
+        if isinstance(obj, data.utils.ReadOnlyList):
+            return list(obj)
         return json.JSONEncoder.default(obj)
\ No newline at end of file
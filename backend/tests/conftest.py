@@ -0,0 +1,16 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+import json
+import os.path as osp
+import pytest
+
+from src.common import StateManager
+
+EXAMPLE = osp.join(osp.dirname(__file__), '..', '..', 'docs', 'example.json')
+
+@pytest.fixture
+def sm():
+    """State manager loaded with the example configuration."""
+    with open(EXAMPLE) as f:
+        state = json.loads(json.load(f)['be']['data'])
+    return StateManager(state=state)
@@ -0,0 +1,50 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from src.common import link, traffic, aggregation
+from src.simulation.route import routing_generation
+
+def test_apply_changes_generation_once(sm):
+    trafficIDs = sorted(traffic)
+    ops = [
+        {
+            'method': 'update', 'data_type': 'traffic',
+            'target': trafficIDs[0], 'query': {'bandwidth': 5}
+        },
+        {
+            'method': 'delete', 'data_type': 'traffic',
+            'target': trafficIDs[1], 'query': {}
+        },
+        {
+            'method': 'delete', 'data_type': 'traffic',
+            'target': trafficIDs[2], 'query': {}
+        },
+        {
+            'method': 'delete', 'data_type': 'link',
+            'target': sorted(link)[0], 'query': {}
+        },
+        {
+            'method': 'create', 'data_type': 'node', 'node_type': 'DEVICE',
+            'model': 'ETHMODEL1', 'query': {'name': 'device'}
+        },
+    ]
+    before = routing_generation()
+    sm.apply(ops)
+    after = routing_generation()
+
+    assert [a - b for a, b in zip(after, before)] == [1, 1]
+    assert aggregation.journal == []
+
+def test_apply_holds_journal(sm):
+    trafficIDs = sorted(traffic)[:3]
+    ops = [
+        {
+            'method': 'update', 'data_type': 'traffic', 'target': trafficID,
+            'query': {'bandwidth': 5 + i}
+        } for i, trafficID in enumerate(trafficIDs)
+    ]
+    before = routing_generation()
+    sm.apply(ops)
+
+    # routes survive a batch of bandwidth updates
+    assert routing_generation() == before
+    assert len(aggregation.journal) == len(trafficIDs)
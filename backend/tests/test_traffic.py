@@ -0,0 +1,23 @@
+# Author: yf-yang <directoryyf@gmail.com>
+
+from src.common import traffic, aggregation
+from src.simulation import route
+
+def test_clear_bandwidth(sm):
+    trafficID = sorted(traffic)[0]
+
+    traffic.delete(target=trafficID, query={'bandwidth': None})
+
+    assert traffic[trafficID]['bandwidth'] is None
+    method, dst, src = aggregation._flows[trafficID]
+    clusters = aggregation.utraffic if method == 'UNICAST' \
+        else aggregation.mtraffic
+    cluster = clusters[dst][src]
+    assert cluster['bandwidth'] == sum(
+        flow['bandwidth'] for flow in cluster['traffic'])
+    assert {
+        flow['ID']: flow['bandwidth'] for flow in cluster['traffic']
+    }[trafficID] == 0
+
+    # routes are still simulated from the cleared traffic
+    route.query_bws()